@@ -8,4 +8,5 @@ Advanced Photon Source.
 from xtomo.xtomo_dataset import XTomoDataset as xtomodataset
 import xtomo.xtomo_preprocess
 import xtomo.xtomo_recon
-import xtomo.xtomo_postprocess
\ No newline at end of file
+import xtomo.xtomo_postprocess
+import xtomo.xtomo_stream
\ No newline at end of file
@@ -17,9 +17,15 @@ void apply_padding(float* data, int num_projections,
             i = iproj + n * num_pixels;
             j = ipproj + n * num_pad;
 
+            for (k = -pad_width; k < 0; k++) {
+                padded_data[j+k] = 1.;
+            }
             for (k = 0; k < num_pixels; k++) {
                 padded_data[j+k] = data[i+k];
             }
+            for (k = num_pixels; k < num_pad-pad_width; k++) {
+                padded_data[j+k] = 1.;
+            }
         }
     }
 }
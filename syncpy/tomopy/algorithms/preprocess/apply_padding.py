@@ -12,7 +12,27 @@ libprep = ctypes.CDLL(libpath)
 
 # --------------------------------------------------------------------
 
-def _apply_padding(data, num_pad):
+def _apply_padding(args):
+    """
+    Pad projections with ones on both sides
+    along the pixel axis.
+
+    Parameters
+    ----------
+    data : ndarray
+        Projection data.
+        
+    num_pad : scalar
+        Number of pixels after padding.
+
+    Returns
+    -------
+    padded_data : ndarray
+        Padded data.
+    """
+    data, args, ind_start, ind_end = args
+    num_pad = args
+    data = np.ascontiguousarray(data, dtype='float32')
     
     num_projections = np.array(data.shape[0], dtype='int32')
     num_slices = np.array(data.shape[1], dtype='int32')
@@ -22,7 +42,8 @@ def _apply_padding(data, num_pad):
     # Call C function.
     c_float_p = ctypes.POINTER(ctypes.c_float)
     
-    padded_data = np.ones((num_projections, num_slices, num_pad), 
+    # Every element is written by the C function.
+    padded_data = np.empty((num_projections, num_slices, num_pad), 
                            dtype='float32')
     
     libprep.apply_padding.restype = ctypes.POINTER(ctypes.c_void_p)
@@ -32,6 +53,6 @@ def _apply_padding(data, num_pad):
                           ctypes.c_int(num_pixels),
                           ctypes.c_int(num_pad),
                           padded_data.ctypes.data_as(c_float_p))
-    return padded_data
+    return ind_start, ind_end, padded_data
     
     
\ No newline at end of file
@@ -12,7 +12,27 @@ libprep = ctypes.CDLL(libpath)
 
 # --------------------------------------------------------------------
 
-def _correct_drift(data, air_pixels):
+def _correct_drift(args):
+    """
+    Correct intensity drifts of every projection
+    row using the air pixels at both ends.
+
+    Parameters
+    ----------
+    data : ndarray
+        Projection data.
+        
+    air_pixels : scalar
+        Number of air pixels at each end of a row.
+
+    Returns
+    -------
+    data : ndarray
+        Corrected data.
+    """
+    data, args, ind_start, ind_end = args
+    air_pixels = args
+    data = np.ascontiguousarray(data, dtype='float32')
     
     num_projections = np.array(data.shape[0], dtype='int32')
     num_slices = np.array(data.shape[1], dtype='int32')
@@ -28,4 +48,4 @@ def _correct_drift(data, air_pixels):
                           ctypes.c_int(num_slices),
                           ctypes.c_int(num_pixels),
                           ctypes.c_int(air_pixels))
-    return data
\ No newline at end of file
+    return ind_start, ind_end, data
\ No newline at end of file
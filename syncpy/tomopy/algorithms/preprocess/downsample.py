@@ -12,7 +12,27 @@ libprep = ctypes.CDLL(libpath)
 
 # --------------------------------------------------------------------
 
-def _downsample2d(data, level):
+def _downsample2d(args):
+    """
+    Downsample projections by binning 2**level
+    pixels along the pixel axis.
+
+    Parameters
+    ----------
+    data : ndarray
+        Projection data.
+        
+    level : scalar
+        Downsampling level.
+
+    Returns
+    -------
+    downsampled_data : ndarray
+        Downsampled data.
+    """
+    data, args, ind_start, ind_end = args
+    level = args
+    data = np.ascontiguousarray(data, dtype='float32')
     
     num_projections = np.array(data.shape[0], dtype='int32')
     num_slices = np.array(data.shape[1], dtype='int32')
@@ -34,11 +54,31 @@ def _downsample2d(data, level):
                          ctypes.c_int(num_pixels),
                          ctypes.c_int(level),
                          downsampled_data.ctypes.data_as(c_float_p))
-    return downsampled_data
+    return ind_start, ind_end, downsampled_data
 
 # --------------------------------------------------------------------
 
-def _downsample3d(data, level):
+def _downsample3d(args):
+    """
+    Downsample projections by binning 2**level
+    pixels along both the slice and pixel axes.
+
+    Parameters
+    ----------
+    data : ndarray
+        Projection data.
+        
+    level : scalar
+        Downsampling level.
+
+    Returns
+    -------
+    downsampled_data : ndarray
+        Downsampled data.
+    """
+    data, args, ind_start, ind_end = args
+    level = args
+    data = np.ascontiguousarray(data, dtype='float32')
     
     num_projections = np.array(data.shape[0], dtype='int32')
     num_slices = np.array(data.shape[1], dtype='int32')
@@ -60,4 +100,4 @@ def _downsample3d(data, level):
                          ctypes.c_int(num_pixels),
                          ctypes.c_int(level),
                          downsampled_data.ctypes.data_as(c_float_p))
-    return downsampled_data
+    return ind_start, ind_end, downsampled_data
@@ -0,0 +1,248 @@
+#include <stdlib.h>
+#include <string.h>
+
+
+/* Index of pixel i of a row of n pixels with reflected
+   edges (d c b a | a b c d | d c b a). */
+static int reflect(int i, int n) {
+    i %= 2 * n;
+    if (i < 0) {
+        i += 2 * n;
+    }
+    if (i >= n) {
+        i = 2 * n - i - 1;
+    }
+    return i;
+}
+
+
+/* Running median of width size along the last axis of a
+   [num_rows, num_pixels] array. The window of each row is
+   kept sorted: moving it by one pixel removes one value and
+   inserts another, shifting only the entries in between.
+   out may be the same array as data. */
+void median_filter_1d(float* data, int num_rows,
+                      int num_pixels, int size, float* out) {
+
+    int m, k, j, lo, hi, pos, left, right;
+    float old_val, new_val, tmp;
+    float *row, *win;
+
+    left = size / 2;
+    right = size - 1 - left;
+
+    row = (float*)malloc(num_pixels * sizeof(float));
+    win = (float*)malloc(size * sizeof(float));
+
+    for (m = 0; m < num_rows; m++) {
+        // Keep the original row, out may overwrite it.
+        memcpy(row, data + m * num_pixels, num_pixels * sizeof(float));
+
+        // Sort the first window.
+        for (j = 0; j < size; j++) {
+            tmp = row[reflect(j - left, num_pixels)];
+            for (pos = j; pos > 0 && win[pos-1] > tmp; pos--) {
+                win[pos] = win[pos-1];
+            }
+            win[pos] = tmp;
+        }
+        out[m * num_pixels] = win[left];
+
+        for (k = 1; k < num_pixels; k++) {
+            old_val = row[reflect(k - left - 1, num_pixels)];
+            new_val = row[reflect(k + right, num_pixels)];
+
+            // Find the leaving value.
+            lo = 0;
+            hi = size - 1;
+            while (lo < hi) {
+                j = (lo + hi) / 2;
+                if (win[j] < old_val) {
+                    lo = j + 1;
+                }
+                else {
+                    hi = j;
+                }
+            }
+            pos = lo;
+
+            // Replace it and move the entering value in place.
+            if (new_val > old_val) {
+                for (; pos < size - 1 && win[pos+1] < new_val; pos++) {
+                    win[pos] = win[pos+1];
+                }
+            }
+            else {
+                for (; pos > 0 && win[pos-1] > new_val; pos--) {
+                    win[pos] = win[pos-1];
+                }
+            }
+            win[pos] = new_val;
+            out[m * num_pixels + k] = win[left];
+        }
+    }
+
+    free(row);
+    free(win);
+}
+
+
+/* Two heaps over the values of a window: a max-heap lo
+   holding its smaller half, median on top, and a min-heap
+   hi holding the rest. Heap entries are window slots, and
+   where[slot] is the heap position of the slot, or ~position
+   if it is in hi. */
+typedef struct {
+    float *val;
+    int *lo, *hi, *where;
+    int lo_n, hi_n;
+} heaps_t;
+
+static int heap_less(heaps_t *h, int a, int b) {
+    return h->val[a] < h->val[b];
+}
+
+static void heap_swap(heaps_t *h, int *heap, int i, int j, int hi) {
+    int tmp = heap[i];
+    heap[i] = heap[j];
+    heap[j] = tmp;
+    h->where[heap[i]] = hi ? ~i : i;
+    h->where[heap[j]] = hi ? ~j : j;
+}
+
+/* Move entry i of lo (hi) up while it is larger (smaller)
+   than its parent, or down while a child is larger (smaller). */
+static void heap_fix(heaps_t *h, int hi, int i) {
+    int *heap = hi ? h->hi : h->lo;
+    int n = hi ? h->hi_n : h->lo_n;
+    int c;
+
+    while (i > 0 && (hi ? heap_less(h, heap[i], heap[(i-1)/2])
+                        : heap_less(h, heap[(i-1)/2], heap[i]))) {
+        heap_swap(h, heap, i, (i-1)/2, hi);
+        i = (i-1)/2;
+    }
+    while ((c = 2 * i + 1) < n) {
+        if (c + 1 < n && (hi ? heap_less(h, heap[c+1], heap[c])
+                             : heap_less(h, heap[c], heap[c+1]))) {
+            c++;
+        }
+        if (!(hi ? heap_less(h, heap[c], heap[i])
+                 : heap_less(h, heap[i], heap[c]))) {
+            break;
+        }
+        heap_swap(h, heap, i, c, hi);
+        i = c;
+    }
+}
+
+/* Replace the value of a window slot, in O(log size). */
+static void heaps_replace(heaps_t *h, int slot, float new_val) {
+    int tmp, p = h->where[slot];
+
+    h->val[slot] = new_val;
+    heap_fix(h, p < 0, p < 0 ? ~p : p);
+
+    // One value changed, so at most one pair is out of order.
+    if (h->hi_n > 0 && heap_less(h, h->hi[0], h->lo[0])) {
+        tmp = h->lo[0];
+        h->lo[0] = h->hi[0];
+        h->hi[0] = tmp;
+        h->where[h->lo[0]] = 0;
+        h->where[h->hi[0]] = ~0;
+        heap_fix(h, 0, 0);
+        heap_fix(h, 1, 0);
+    }
+}
+
+typedef struct {
+    float val;
+    int slot;
+} entry_t;
+
+static int cmp_entry(const void *a, const void *b) {
+    float x = ((const entry_t*)a)->val, y = ((const entry_t*)b)->val;
+    return (x > y) - (x < y);
+}
+
+
+/* Running median of width size (odd) along the first axis of
+   a [num_rows, num_cols] array, with reflected edges. For
+   each column, the window is held in two heaps, so moving it
+   by one row costs O(log size) whatever its width. Columns
+   are copied in blocks to keep memory access contiguous.
+   out may be the same array as data. */
+#define COL_BLOCK 64
+
+void running_median(float* data, int num_rows,
+                    int num_cols, int size, float* out) {
+
+    int m, n, b, j, half, block;
+    float *col, *med;
+    entry_t *first;
+    heaps_t h;
+
+    half = size / 2;
+
+    col = (float*)malloc(COL_BLOCK * num_rows * sizeof(float));
+    med = (float*)malloc(COL_BLOCK * num_rows * sizeof(float));
+    first = (entry_t*)malloc(size * sizeof(entry_t));
+    h.val = (float*)malloc(size * sizeof(float));
+    h.lo = (int*)malloc(size * sizeof(int));
+    h.hi = (int*)malloc(size * sizeof(int));
+    h.where = (int*)malloc(size * sizeof(int));
+    h.lo_n = half + 1;
+    h.hi_n = size - h.lo_n;
+
+    for (n = 0; n < num_cols; n += COL_BLOCK) {
+        block = num_cols - n < COL_BLOCK ? num_cols - n : COL_BLOCK;
+
+        // Keep the original columns, out may overwrite them.
+        for (m = 0; m < num_rows; m++) {
+            for (b = 0; b < block; b++) {
+                col[b * num_rows + m] = data[m * num_cols + n + b];
+            }
+        }
+
+        for (b = 0; b < block; b++) {
+            // Fill the first window: slot j holds row j - half.
+            // Sorted halves are valid heaps already.
+            for (j = 0; j < size; j++) {
+                h.val[j] = col[b * num_rows + reflect(j - half, num_rows)];
+                first[j].val = h.val[j];
+                first[j].slot = j;
+            }
+            qsort(first, size, sizeof(entry_t), cmp_entry);
+            for (j = 0; j < h.lo_n; j++) {
+                h.lo[j] = first[h.lo_n-1-j].slot;
+                h.where[h.lo[j]] = j;
+            }
+            for (j = 0; j < h.hi_n; j++) {
+                h.hi[j] = first[h.lo_n+j].slot;
+                h.where[h.hi[j]] = ~j;
+            }
+            med[b * num_rows] = h.val[h.lo[0]];
+
+            // The row entering at m takes the slot of the one leaving.
+            for (m = 1; m < num_rows; m++) {
+                heaps_replace(&h, (m - 1) % size,
+                              col[b * num_rows + reflect(m + half, num_rows)]);
+                med[b * num_rows + m] = h.val[h.lo[0]];
+            }
+        }
+
+        for (m = 0; m < num_rows; m++) {
+            for (b = 0; b < block; b++) {
+                out[m * num_cols + n + b] = med[b * num_rows + m];
+            }
+        }
+    }
+
+    free(col);
+    free(med);
+    free(first);
+    free(h.val);
+    free(h.lo);
+    free(h.hi);
+    free(h.where);
+}
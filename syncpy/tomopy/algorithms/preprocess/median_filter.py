@@ -1,5 +1,14 @@
 # -*- coding: utf-8 -*-
-from scipy.ndimage import filters
+import numpy as np
+import os
+import ctypes
+
+# --------------------------------------------------------------------
+
+# Get the shared library.
+libpath = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                          '../..', 'lib/libprep.so'))
+libprep = ctypes.CDLL(libpath)
 
 # --------------------------------------------------------------------
 
@@ -23,6 +32,119 @@ def _median_filter(args):
     data, args, ind_start, ind_end = args
     size = args
     
-    for m in range(ind_end-ind_start):
-        data[:, m, :] = filters.median_filter(data[:, m, :], (1, size))
-    return ind_start, ind_end, data
\ No newline at end of file
+    # All slices of the chunk in one pass, in place.
+    data = np.ascontiguousarray(data, dtype='float32')
+    _median_filter_1d(data, size, out=data)
+    return ind_start, ind_end, data
+
+# --------------------------------------------------------------------
+
+def _median_filter_1d(data, size, out=None):
+    """
+    Running median along the last axis of data,
+    with reflected edges. Same as a median filter
+    of footprint (1, ..., 1, size), but its cost
+    hardly grows with size. The window can not be
+    wider than twice the rows, which is as far as
+    one reflection on each side reaches.
+
+    Parameters
+    ----------
+    data : ndarray
+        Input data.
+        
+    size : scalar
+        The size of the filter.
+        
+    out : ndarray, optional
+        Output array, which can be data itself.
+
+    Returns
+    -------
+    out : ndarray
+        Median filtered data.
+    """
+    data = np.ascontiguousarray(data, dtype='float32')
+    if size > 2 * data.shape[-1]:
+        raise ValueError("median filter size " + str(size) + 
+                         " is over twice the row width " + 
+                         str(data.shape[-1]))
+    
+    # The kernel writes to contiguous float32 arrays only.
+    res = out
+    if (out is None or out.dtype != np.float32 or 
+        not out.flags['C_CONTIGUOUS']):
+        res = np.empty_like(data)
+    
+    num_pixels = np.array(data.shape[-1], dtype='int32')
+    num_rows = np.array(data.size / max(num_pixels, 1), dtype='int32')
+    
+    # Call C function.
+    c_float_p = ctypes.POINTER(ctypes.c_float)
+    
+    libprep.median_filter_1d.restype = ctypes.POINTER(ctypes.c_void_p)
+    libprep.median_filter_1d(data.ctypes.data_as(c_float_p),
+                             ctypes.c_int(num_rows),
+                             ctypes.c_int(num_pixels),
+                             ctypes.c_int(size),
+                             res.ctypes.data_as(c_float_p))
+    if out is None:
+        return res
+    if res is not out:
+        out[:] = res
+    return out
+
+# --------------------------------------------------------------------
+
+def _running_median(data, half_width, out=None):
+    """
+    Running median along the first axis of a 2-D
+    array with a window of ``2*half_width+1`` rows.
+    Edges are reflected.
+    
+    Each column keeps its window in two heaps, the
+    smaller half and the larger one, so moving the
+    window by one row costs O(log width) instead of
+    sorting it again.
+
+    Parameters
+    ----------
+    data : ndarray
+        Input data.
+        
+    half_width : scalar
+        Number of rows on each side of the window center.
+        
+    out : ndarray, optional
+        Output array, which can be data itself.
+
+    Returns
+    -------
+    out : ndarray
+        Median filtered data.
+    """
+    data = np.ascontiguousarray(data, dtype='float32')
+    
+    # The kernel writes to contiguous float32 arrays only.
+    res = out
+    if (out is None or out.dtype != np.float32 or 
+        not out.flags['C_CONTIGUOUS']):
+        res = np.empty_like(data)
+    
+    num_rows = np.array(data.shape[0], dtype='int32')
+    num_cols = np.array(data.size / max(num_rows, 1), dtype='int32')
+    
+    # Call C function.
+    c_float_p = ctypes.POINTER(ctypes.c_float)
+    
+    libprep.running_median.restype = ctypes.POINTER(ctypes.c_void_p)
+    libprep.running_median(data.ctypes.data_as(c_float_p),
+                           ctypes.c_int(num_rows),
+                           ctypes.c_int(num_cols),
+                           ctypes.c_int(2 * half_width + 1),
+                           res.ctypes.data_as(c_float_p))
+    if out is None:
+        return res
+    if res is not out:
+        out[:] = res
+    return out
@@ -3,25 +3,96 @@ import numpy as np
 
 # --------------------------------------------------------------------
 
+# Smallest value the minus logarithm is taken of.
+LOG_FLOOR = 1e-6
+
+# --------------------------------------------------------------------
+
 def _normalize(args):
     """
     Normalize raw projection data with
     the white field projection data.
+    
+    White fields taken at different times can
+    instead be interpolated for each projection
+    (see ``_normalize_dynamic``).
 
     Parameters
     ----------
     data : ndarray
-        Raw projection data.
+        Raw projection data. Integer data is
+        converted to float32.
 
-    data_white : ndarray
-        2-D white field projection data.
+    data_dark : ndarray
+        2-D dark field projection data.
         
+    flat_scale : ndarray
+        Reciprocal of the flat field, that is
+        1 / (data_white - data_dark), computed
+        once for all projections.
+
+    cutoff : scalar
+        Permitted maximum vaue of the
+        normalized data. 
+        
+    minus_log : bool
+        If ``True`` the minus logarithm of the
+        normalized data is returned. Values below
+        ``LOG_FLOOR`` are raised to it first.
+
+    Returns
+    -------
+    data : ndarray
+        Normalized data.
+    """
+    data, args, ind_start, ind_end = args
+    data_dark, flat_scale, cutoff, minus_log = args
+    
+    if data.dtype != np.float32:
+        data = np.array(data, dtype='float32')
+
+    # Everything is done in place on the whole chunk.
+    np.subtract(data, data_dark, data)
+    np.multiply(data, flat_scale, data)
+    _finish(data, cutoff, minus_log)
+    return ind_start, ind_end, data
+
+# --------------------------------------------------------------------
+
+def _normalize_dynamic(args):
+    """
+    Normalize raw projection data with white fields
+    interpolated linearly between the times (or
+    projection numbers) they were taken at.
+
+    Parameters
+    ----------
+    data : ndarray
+        Raw projection data. Integer data is
+        converted to float32.
+
     data_dark : ndarray
         2-D dark field projection data.
+        
+    flats : ndarray
+        3-D dark-subtracted white fields, one for
+        each acquisition time (see ``_flat_interpolation``).
+        
+    lower, upper : ndarray
+        Indices in ``flats`` of the white fields taken
+        before and after each projection.
+        
+    weight : ndarray
+        Interpolation weight of the ``upper`` white
+        field for each projection.
 
     cutoff : scalar
         Permitted maximum vaue of the
         normalized data. 
+        
+    minus_log : bool
+        If ``True`` the minus logarithm of the
+        normalized data is returned.
 
     Returns
     -------
@@ -29,12 +100,88 @@ def _normalize(args):
         Normalized data.
     """
     data, args, ind_start, ind_end = args
-    data_white, data_dark, cutoff = args
+    data_dark, flats, lower, upper, weight, cutoff, minus_log = args
+    
+    if data.dtype != np.float32:
+        data = np.array(data, dtype='float32')
+        
+    # Interpolated flat field for every projection in the chunk.
+    weight = weight[ind_start:ind_end, np.newaxis, np.newaxis]
+    flat = flats[lower[ind_start:ind_end]]
+    delta = flats[upper[ind_start:ind_end]]
+    np.subtract(delta, flat, delta)
+    np.multiply(delta, weight, delta)
+    np.add(flat, delta, flat)
+    
+    np.subtract(data, data_dark, data)
+    np.divide(data, flat, data)
+    _finish(data, cutoff, minus_log)
+    return ind_start, ind_end, data
+
+# --------------------------------------------------------------------
+
+def _flat_interpolation(data_white, data_dark, white_index, proj_index):
+    """
+    Prepare the arguments of ``_normalize_dynamic``.
+    
+    Parameters
+    ----------
+    data_white : ndarray
+        3-D white field data.
+        
+    data_dark : ndarray
+        2-D dark field projection data.
+        
+    white_index : ndarray
+        Time stamp or projection number at which each
+        white field was taken. White fields sharing the
+        same value are averaged.
+        
+    proj_index : ndarray
+        Time stamp or projection number of each
+        projection, in the same units.
+
+    Returns
+    -------
+    flats : ndarray
+        Averaged dark-subtracted white fields.
+        
+    lower, upper, weight : ndarray
+        Interpolation indices and weights for
+        each projection.
+    """
+    white_index = np.asarray(white_index, dtype='float64')
+    proj_index = np.asarray(proj_index, dtype='float64')
     
+    # Average white fields taken at the same time.
+    times = np.unique(white_index)
+    flats = np.empty((times.size,) + data_white.shape[1:], dtype='float32')
+    for m in range(times.size):
+        flats[m] = np.mean(data_white[white_index == times[m]], axis=0)
+    flats -= data_dark
+    
+    # Bracketing white fields, clamped at both ends of the scan.
+    if times.size == 1:
+        upper = np.zeros(proj_index.size, dtype='int32')
+        lower = upper
+        weight = np.zeros(proj_index.size, dtype='float32')
+    else:
+        upper = np.searchsorted(times, proj_index)
+        upper = np.clip(upper, 1, times.size-1).astype('int32')
+        lower = upper - 1
+        weight = (proj_index - times[lower]) / (times[upper] - times[lower])
+        weight = np.clip(weight, 0, 1).astype('float32')
+    return flats, lower, upper, weight
 
-    for m in range(ind_end-ind_start):
-        data[m, :, :] = np.divide(data[m, :, :]-data_dark, 
-                                  data_white-data_dark)
+# --------------------------------------------------------------------
+
+def _finish(data, cutoff, minus_log):
+    """
+    Apply cutoff and minus logarithm in place.
+    """
     if cutoff is not None:
-        data[data > cutoff] = cutoff
-    return ind_start, ind_end, data
\ No newline at end of file
+        np.minimum(data, cutoff, data)
+    if minus_log:
+        np.maximum(data, LOG_FLOOR, data)
+        np.log(data, data)
+        np.negative(data, data)
\ No newline at end of file
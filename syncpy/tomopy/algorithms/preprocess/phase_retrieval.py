@@ -1,11 +1,26 @@
 # -*- coding: utf-8 -*-
 # Filename: phase_retrieval.py
 import numpy as np
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
 from tomopy.tools import constants
 from tomopy.tools import fftw
 
 # --------------------------------------------------------------------
 
+# Number of Paganin filters kept in memory.
+FILTER_CACHE_SIZE = 8
+
+# Number of projections read when the padding value is sampled.
+PAD_SAMPLES = 32
+
+# Filters keyed by acquisition geometry, least recently used first.
+_filter_cache = OrderedDict()
+
+# --------------------------------------------------------------------
+
 def _phase_retrieval(args):
     """
     Perform single-material phase retrieval
@@ -31,6 +46,20 @@ def _phase_retrieval(args):
     padding : bool, optional
         Applies padding for Fourier transform. For quick testing
         you can use False for faster results.
+        
+    pad_value : scalar or str, optional
+        Value of the padded pixels. 'mean' uses the mean of the
+        first and last columns of all projections, 'sample' the
+        same mean over a few evenly spaced projections only.
+        When the step is deferred in lazy mode, these means
+        are taken over the projections of each chunk instead,
+        so that it can be fused with the steps before it.
+        
+    cache_dir : str, optional
+        Directory where computed filters are stored and looked
+        up, so that scans with the same geometry do not need
+        to build them again. Filters are always cached in
+        memory as well.
 
     Returns
     -------
@@ -43,45 +72,73 @@ def _phase_retrieval(args):
     <http://onlinelibrary.wiley.com/doi/10.1046/j.1365-2818.2002.01010.x/abstract>`_
     """
     data, args, ind_start, ind_end = args
-    H, x_shift, y_shift, tmp_proj, padding = args
+    H, x_shift, y_shift, tmp_proj, padding, pad_value = args
+    
+    if data.dtype != np.float32:
+        data = np.array(data, dtype='float32')
     
     num_proj, dx, dy = data.shape # dx:slices, dy:pixels
     
-    for m in range(num_proj):
-        proj = data[m, :, :]
-        
-        if padding:
-            tmp_proj[x_shift:dx+x_shift, y_shift:dy+y_shift] = proj
-            fft_proj = fftw.fftw2(tmp_proj)
-            filtered_proj = np.multiply(H, fft_proj)
-            tmp = np.real(fftw.ifftw2(filtered_proj))/np.max(H)
-            proj = tmp[x_shift:dx+x_shift, y_shift:dy+y_shift]   
-                
-        elif not padding:
-            fft_proj = fftw.fftw2(proj)
-            filtered_proj = np.multiply(H, fft_proj)
-            proj = np.real(fftw.ifftw2(filtered_proj))/np.max(H)
+    # All projections of the chunk go through one batched
+    # real-to-complex transform and back.
+    if padding:
+        num_x, num_y = tmp_proj.shape
+        work = np.empty((num_proj, num_x, num_y), dtype='float32')
+        if pad_value is None:
+            work[:] = tmp_proj
+        else: # Padding value taken from this chunk.
+            work[:] = _pad_value(data, pad_value)
+        work[:, x_shift:dx+x_shift, y_shift:dy+y_shift] = data
+    else:
+        num_y = dy
+        work = np.ascontiguousarray(data, dtype='float32')
         
-        data[m, :, :] = proj
+    fft_proj = fftw.rfftw2(work)
+    np.multiply(fft_proj, H, fft_proj)
+    fftw.irfftw2(fft_proj, num_y, out=work)
+    
+    if padding:
+        data[:] = work[:, x_shift:dx+x_shift, y_shift:dy+y_shift]
+    else:
+        data = work
         
     return ind_start, ind_end, data
     
 # --------------------------------------------------------------------
 
-def _paganin_filter(data, pixel_size, dist, energy, alpha, padding):
+def _pad_value(data, pad_value):
+    """
+    Padding value of the phase retrieval: ``pad_value``
+    itself, or the mean of the first and last columns of
+    the projections for 'mean', or of a few of them for
+    'sample'.
+    """
+    num_proj, dx, dy = data.shape
+    if pad_value == 'mean':
+        pad_value = (np.mean(data[:, :, 0]) + np.mean(data[:, :, dy-1])) / 2
+    elif pad_value == 'sample':
+        step = max(1, num_proj // PAD_SAMPLES)
+        pad_value = (np.mean(data[::step, :, 0]) + 
+                     np.mean(data[::step, :, dy-1])) / 2
+    return pad_value
+
+# --------------------------------------------------------------------
+
+def _paganin_filter(data, pixel_size, dist, energy, alpha, padding,
+                    pad_value='mean', cache_dir=None):
     num_proj, dx, dy = data.shape # dx:slices, dy:pixels
     wavelength = 2 * constants.PI * constants.PLANCK_CONSTANT * \
                 constants.SPEED_OF_LIGHT / energy
                 
     if padding:
         # Find padding values.
-        pad_value = np.mean((data[:, :, 0] + data[:, :, dy-1]) / 2)
+        pad_value = _pad_value(data, pad_value)
         
         # Fourier padding in powers of 2.
         pad_pixels = np.ceil(constants.PI * wavelength * dist / pixel_size ** 2)
         
-        num_x = pow(2, np.ceil(np.log2(dx + pad_pixels)))
-        num_y = pow(2, np.ceil(np.log2(dy + pad_pixels)))
+        num_x = int(pow(2, np.ceil(np.log2(dx + pad_pixels))))
+        num_y = int(pow(2, np.ceil(np.log2(dy + pad_pixels))))
         x_shift = int((num_x - dx) / 2.0)
         y_shift = int((num_y - dy) / 2.0)
         
@@ -90,8 +147,24 @@ def _paganin_filter(data, pixel_size, dist, energy, alpha, padding):
         
     elif not padding:
         num_x, num_y = dx, dy
-        x_shift, y_shift, tmp_data = None, None, None
-                
+        x_shift, y_shift, tmp_proj = None, None, None
+        
+    # Look for a filter of the same geometry.
+    key = (float(pixel_size), float(dist), float(energy), 
+           float(alpha), num_x, num_y)
+    H = _cached_filter(key, cache_dir)
+    if H is None:
+        H = _build_filter(wavelength, pixel_size, dist, alpha, num_x, num_y)
+        _store_filter(key, H, cache_dir)
+        
+    return H, x_shift, y_shift, tmp_proj
+
+# --------------------------------------------------------------------
+
+def _build_filter(wavelength, pixel_size, dist, alpha, num_x, num_y):
+    """
+    Half-plane Paganin filter normalized by its maximum.
+    """
     # Sampling in reciprocal space.
     indx = (1 / ((num_x-1) * pixel_size)) * np.arange(-(num_x-1)*0.5, num_x*0.5)
     indy = (1 / ((num_y-1) * pixel_size)) * np.arange(-(num_y-1)*0.5, num_y*0.5)
@@ -101,6 +174,57 @@ def _paganin_filter(data, pixel_size, dist, energy, alpha, padding):
     # Filter in Fourier space.
     H = 1 / (wavelength * dist * w2 / (4 * constants.PI) + alpha)
     H = np.fft.fftshift(H)
+    
+    # The real part of the filtered projection only sees the
+    # symmetric part of H, which allows real-to-complex FFTs
+    # with half of the spectrum. Normalize it once here.
+    H = (H + H[-np.arange(num_x) % num_x][:, -np.arange(num_y) % num_y]) / 2
+    H = H[:, :num_y // 2 + 1] / np.max(H)
+    H = np.array(H, dtype='float32')
+    return H
 
-    return H, x_shift, y_shift, tmp_proj
+# --------------------------------------------------------------------
+
+def _cache_file(key, cache_dir):
+    """
+    File name of a cached filter.
+    """
+    name = hashlib.md5(repr(key).encode('ascii')).hexdigest()
+    return os.path.join(cache_dir, 'paganin-' + name + '.npy')
+
+# --------------------------------------------------------------------
+
+def _cached_filter(key, cache_dir=None):
+    """
+    Filter from the memory or disk cache, or None.
+    """
+    H = _filter_cache.pop(key, None)
+    if H is None and cache_dir is not None:
+        file_name = _cache_file(key, cache_dir)
+        if os.path.isfile(file_name):
+            H = np.load(file_name)
+    if H is not None:
+        _store_filter(key, H)
+    return H
+
+# --------------------------------------------------------------------
+
+def _store_filter(key, H, cache_dir=None):
+    """
+    Add a filter to the memory cache, dropping the least
+    recently used ones, and to the disk cache if given.
+    """
+    _filter_cache[key] = H
+    while len(_filter_cache) > FILTER_CACHE_SIZE:
+        _filter_cache.popitem(last=False)
+        
+    if cache_dir is not None:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # Write to a temporary file first, so that concurrent
+        # runs never read a partial filter.
+        fd, tmp_name = tempfile.mkstemp(suffix='.npy', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, H)
+        os.rename(tmp_name, _cache_file(key, cache_dir))
 
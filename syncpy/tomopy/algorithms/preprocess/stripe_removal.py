@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 import pywt
+from median_filter import _median_filter_1d
 
 # --------------------------------------------------------------------
 
@@ -21,6 +22,9 @@ def _stripe_removal(args):
 
     sigma : scalar
         Damping parameter in Fourier space.
+        
+    See ``_stripe_removal_sort`` for a faster
+    sorting-based method.
 
     References
     ----------
@@ -30,45 +34,90 @@ def _stripe_removal(args):
     data, args, ind_start, ind_end = args
     level, wname, sigma = args
     
+    if data.dtype != np.float32:
+        data = np.array(data, dtype='float32')
+    
     dx, num_slices, dy = data.shape
     
-    # Padded temp image.
+    # Padded temp images of all slices, allocated once.
     #num_x = dx + dx / 8
     num_x = dx + 20
     x_shift = int((num_x - dx) / 2.)
-    sli = np.zeros((num_x, dy), dtype='float32')
+    sli = np.zeros((num_slices, num_x, dy), dtype='float32')
+    sli[:, x_shift:dx+x_shift, :] = np.swapaxes(data, 0, 1)
     
-    for n in range(num_slices):
-        sli[x_shift:dx+x_shift, :] = data[:, n, :]
+    # Wavelet decomposition.
+    coeffs = [pywt.wavedec2(sli[n], wname, level=level) 
+              for n in range(num_slices)]
+    
+    # FFT transform of horizontal frequency bands,
+    # for all slices at once.
+    for m in range(1, level+1):
+        cV = np.array([c[m][1] for c in coeffs])
+        my = cV.shape[1]
         
-        # Wavelet decomposition.
-        cH = []
-        cV = []
-        cD = []
-        for m in range(level):
-            sli, (cHt, cVt, cDt) = pywt.dwt2(sli, wname)
-            cH.append(cHt)
-            cV.append(cVt)
-            cD.append(cDt)
+        # Damping of ring artifact information, shifted
+        # once to the order of the unshifted spectrum.
+        y_hat = (np.arange(-my, my, 2, dtype='float')+1) / 2
+        damp = 1 - np.exp(-np.power(y_hat, 2) / (2 * np.power(sigma, 2)))
+        damp = np.fft.ifftshift(damp)[:, np.newaxis]
+        
+        fcV = np.fft.fft(cV, axis=1)
+        np.multiply(fcV, damp, fcV)
+        cV = np.real(np.fft.ifft(fcV, axis=1))
+        for n in range(num_slices):
+            cH, cVt, cD = coeffs[n][m]
+            coeffs[n][m] = (cH, cV[n], cD)
     
-        # FFT transform of horizontal frequency bands.
-        for m in range(level):
-            # FFT
-            fcV = np.fft.fftshift(np.fft.fft(cV[m], axis=0))
-            my, mx = fcV.shape
+    # Wavelet reconstruction.
+    for n in range(num_slices):
+        sli = pywt.waverec2(coeffs[n], wname)
+        data[:, n, :] = sli[x_shift:dx+x_shift, 0:dy]
+    return ind_start, ind_end, data
+
+# --------------------------------------------------------------------
+
+def _stripe_removal_sort(args):
+    """
+    Remove stripes from sinogram data by sorting.
     
-            # Damping of ring artifact information.
-            y_hat = (np.arange(-my, my, 2, dtype='float')+1) / 2
-            damp = 1 - np.exp(-np.power(y_hat, 2) / (2 * np.power(sigma, 2)))
-            fcV = np.multiply(fcV, np.transpose(np.tile(damp, (mx, 1))))
+    Every detector column of a sinogram is sorted along
+    the projections, the sorted image is smoothed across
+    columns with a median filter, and the values are put
+    back in their original order. Stripes appear as
+    column offsets in the sorted image, where they are
+    easily smoothed out.
+
+    Parameters
+    ----------
+    data : ndarray
+        Projection data.
+
+    size : scalar
+        Width of the median filter across columns.
+
+    References
+    ----------
+    - `Optics Express, Vol 26(22), 28396-28412(2018) \
+    <https://doi.org/10.1364/OE.26.028396>`_
+    """
+    data, args, ind_start, ind_end = args
+    size = args
     
-            # Inverse FFT.
-            cV[m] = np.real(np.fft.ifft(np.fft.ifftshift(fcV), axis=0))
+    if data.dtype != np.float32:
+        data = np.array(data, dtype='float32')
     
-        # Wavelet reconstruction.
-        for m in range(level)[::-1]:
-            sli = sli[0:cH[m].shape[0], 0:cH[m].shape[1]]
-            sli = pywt.idwt2((sli, (cH[m], cV[m], cD[m])), wname)
-            
-        data[:, n, :] = sli[x_shift:dx+x_shift, 0:dy]
+    num_projections, num_slices, num_pixels = data.shape
+    slice_ind = np.arange(num_slices)[np.newaxis, :, np.newaxis]
+    pixel_ind = np.arange(num_pixels)[np.newaxis, np.newaxis, :]
+    
+    # Sort the columns of all sinograms at once.
+    sort_ind = np.argsort(data, axis=0)
+    sorted_data = data[sort_ind, slice_ind, pixel_ind]
+    
+    # Smooth across columns, in place.
+    sorted_data = _median_filter_1d(sorted_data, size, out=sorted_data)
+    
+    # Undo the sorting.
+    data[sort_ind, slice_ind, pixel_ind] = sorted_data
     return ind_start, ind_end, data
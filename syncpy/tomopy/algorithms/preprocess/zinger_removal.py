@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 import numpy as np
-from scipy.ndimage import filters
+from median_filter import _median_filter_1d, _running_median
 
 # --------------------------------------------------------------------
 
 def _zinger_removal(args):
     """
     Zinger removal.
+    
+    Each pixel is compared to the median of its
+    neighbours along the pixel axis. See
+    ``_zinger_removal_temporal`` for a comparison
+    with neighbouring projections instead.
 
     Parameters
     ----------
@@ -22,11 +27,51 @@ def _zinger_removal(args):
     data, args, ind_start, ind_end = args
     zl, mw = args
 
-    zinger_mask = np.zeros((1, data.shape[1], data.shape[2]))
+    if data.dtype != np.float32:
+        data = np.array(data, dtype='float32')
 
-    for m in range(ind_end-ind_start):
-        tmp_img = filters.median_filter(data[m, :, :],(1, mw))
-        zinger_mask = ((data[m, :, :]-tmp_img) >= zl).astype(int)
-        data[m,:,:] = tmp_img*zinger_mask + data[m, :, :]*(1-zinger_mask)
+    # Median along pixels of all projections in the chunk at once.
+    tmp_data = _median_filter_1d(data, mw)
+    
+    # Replace zingers in place.
+    zinger_mask = (data - tmp_data) >= zl
+    np.copyto(data, tmp_data, where=zinger_mask)
 
-    return ind_start, ind_end, data
\ No newline at end of file
+    return ind_start, ind_end, data
+
+# --------------------------------------------------------------------
+
+def _zinger_removal_temporal(args):
+    """
+    Zinger removal using a running median
+    along the projection axis.
+    
+    Data must hold all projections of the
+    slices it covers.
+
+    Parameters
+    ----------
+    data : ndarray
+        Input data.
+        
+    zl : scalar
+        Threshold of counts to cut zingers.
+        
+    mw : scalar
+        Number of projections in the median window.
+        Even widths are increased by one.
+    """
+    data, args, ind_start, ind_end = args
+    zl, mw = args
+    
+    data = np.ascontiguousarray(data, dtype='float32')
+    tmp_data = data.reshape(data.shape[0], -1)
+    
+    # Median of the neighbouring projections.
+    med_data = _running_median(tmp_data, mw // 2)
+    
+    # Replace zingers in place.
+    zinger_mask = (tmp_data - med_data) >= zl
+    np.copyto(tmp_data, med_data, where=zinger_mask)
+
+    return ind_start, ind_end, data
@@ -3,8 +3,12 @@
 #include <math.h>
 #include <stdbool.h>
 
+/* Detector bins of the data lie in the middle of num_pad
+   bins. Bins outside it are virtual padding: zero, or the
+   nearest edge value of the data if pad_edge is set. */
 void art(float* data, float* theta, float center, 
          int num_projections, int num_slices, int num_pixels, 
+         int num_pad, int pad_edge,
          int num_grid, int iters, float* recon) {
               
     float* gridx = (float *)malloc((num_grid+1)*sizeof(float));
@@ -33,7 +37,9 @@ void art(float* data, float* theta, float center,
     int alen, blen, len;
     int i1, i2;
     float x1, x2;
-    int io;
+    int io, pix, pad_width;
+    bool inside;
+    float measured;
     float simdata;
     float srcx, srcy, detx, dety;
     float midx, midy, diffx, diffy;
@@ -42,7 +48,8 @@ void art(float* data, float* theta, float center,
     float upd;
         
         
-    mov = num_pixels/2 - center;
+    pad_width = (num_pad-num_pixels)/2;
+    mov = num_pad/2 - center;
     if (mov-ceil(mov) < 1e-6) {
         mov += 1e-6;
     }
@@ -69,10 +76,19 @@ void art(float* data, float* theta, float center,
                 quadrant = false;
             }
 
-            for (m = 0; m < num_pixels; m++) {
+            for (m = 0; m < num_pad; m++) {
+                
+                pix = m - pad_width;
+                inside = (pix >= 0 && pix < num_pixels);
+                if (pix < 0) {
+                    pix = 0;
+                }
+                if (pix >= num_pixels) {
+                    pix = num_pixels - 1;
+                }
                 
                 xi = -1e6;
-                yi = -(num_pixels-1)/2. + m + mov;
+                yi = -(num_pad-1)/2. + m + mov;
 
                 srcx = xi * cosq - yi * sinq;
                 srcy = xi * sinq + yi * cosq;
@@ -208,14 +224,15 @@ void art(float* data, float* theta, float center,
                 
                 for (k = 0; k < num_slices; k++) {
                     i = k * num_grid * num_grid;
-                    io = iproj + m + (k * num_pixels);
+                    io = iproj + pix + (k * num_pixels);
+                    measured = (inside || pad_edge) ? data[io] : 0;
                     
                     simdata = 0;
                     for (n = 0; n < len-1; n++) {
                         simdata += recon[indi[n]+i] * leng[n];
                     }
                     
-                    upd = (data[io] - simdata) / a2;
+                    upd = (measured - simdata) / a2;
                     for (n = 0; n < len-1; n++) {
                         recon[indi[n]+i] += upd * leng[n];
                     }                   
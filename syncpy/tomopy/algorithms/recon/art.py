@@ -12,11 +12,50 @@ librecon = ctypes.CDLL(libpath)
 
 # --------------------------------------------------------------------
 
-def _art(data, theta, center, num_grid, iters, init_matrix):
-    
+def _art(data, theta, center, num_grid, iters, init_matrix,
+         num_pad=None, pad_edge=False):
+    """
+    ART reconstruction of unpadded projection data.
+
+    Parameters
+    ----------
+    data : ndarray
+        Minus log of the projection data.
+        
+    theta : ndarray
+        Projection angles in radians.
+        
+    center : scalar
+        Rotation center in the padded detector.
+        
+    num_grid : scalar
+        Size of the reconstruction grid.
+        
+    iters : scalar
+        Number of iterations.
+        
+    init_matrix : ndarray
+        Initial reconstruction, updated in place.
+        
+    num_pad : scalar, optional
+        Number of detector bins including padding.
+        Data sits in the middle of them. The padding
+        is virtual, no padded copy of data is made.
+        
+    pad_edge : bool, optional
+        If ``True`` padded bins take the value of the
+        nearest data bin, otherwise they are zeros.
+
+    Returns
+    -------
+    init_matrix : ndarray
+        Reconstructed data.
+    """
     num_projections = np.array(data.shape[0], dtype='int32')
     num_slices = np.array(data.shape[1], dtype='int32')
     num_pixels = np.array(data.shape[2], dtype='int32')
+    if num_pad is None:
+        num_pad = num_pixels
 
     # Call C function.
     c_float_p = ctypes.POINTER(ctypes.c_float)
@@ -27,6 +66,8 @@ def _art(data, theta, center, num_grid, iters, init_matrix):
                  ctypes.c_int(num_projections),
                  ctypes.c_int(num_slices),
                  ctypes.c_int(num_pixels),
+                 ctypes.c_int(num_pad),
+                 ctypes.c_int(pad_edge),
                  ctypes.c_int(num_grid),
                  ctypes.c_int(iters),
                  init_matrix.ctypes.data_as(c_float_p))
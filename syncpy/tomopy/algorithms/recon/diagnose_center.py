@@ -7,7 +7,8 @@ from gridrec import Gridrec
 # --------------------------------------------------------------------
 
 def _diagnose_center(data, theta, dir_path, slice_no, 
-                     center_start, center_end, center_step):
+                     center_start, center_end, center_step,
+                     fluorescence=0):
     """ 
     Diagnostic tools to find rotation center.
     
@@ -30,33 +31,23 @@ def _diagnose_center(data, theta, dir_path, slice_no,
     center_start, center_end, center_step : scalar, optional
         Values of the start, end and step of the center values to
         be used for diagnostics.
+
+    fluorescence : scalar, optional
+        0=absorption data, 1=data that already holds the
+        minus log, which Gridrec then takes as it is.
     """
-    num_projections =  data.shape[0]
-    num_pixels =  data.shape[2]
-    
-    # Don't ask why. Just do that.
-    center_step /= 2.
-    
-    # Make preperations for the slices and corresponding centers.
-    slice_data = data[:, slice_no, :]
+    # Make preperations for the corresponding centers.
     center = np.arange(center_start, center_end, center_step, dtype=np.float32)
-    num_center = center.size
-    stacked_slices = np.zeros((num_projections, num_center, num_pixels),
-                              dtype=np.float32)
-                              
-    for m in range(num_center):
-        stacked_slices[:, m, :] = slice_data
 
     # Reconstruct the same slice with different centers.
-    recon = Gridrec(stacked_slices)
-    recon.reconstruct(stacked_slices, theta=theta, center=center)
+    recon = Gridrec(data, fluorescence=fluorescence)
+    data_recon = recon.reconstruct_centers(data, center, theta, slice_no)
 
     # Save it to a temporary directory for manual inspection.
     for m in range(center.size):
-        if m % 2 == 0: # 2 slices same bec of gridrec.
-            img = misc.toimage(recon.data_recon[m, :, :])
-            file_name = dir_path + str(np.squeeze(center[m])) + ".tif"
-            img.save(file_name)
+        img = misc.toimage(data_recon[m, :, :])
+        file_name = dir_path + str(np.squeeze(center[m])) + ".tif"
+        img.save(file_name)
 
 
 
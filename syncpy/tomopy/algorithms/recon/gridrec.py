@@ -4,6 +4,7 @@ Module for wrapper to gridrec.
 """
 # -*- coding: utf-8 -*-
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 import ctypes
 import os
 import multiprocessing as mp
@@ -14,6 +15,7 @@ import multiprocessing as mp
 libpath = os.path.abspath(os.path.join(os.path.dirname(__file__), 
                           '../..', 'lib/librecon.so'))
 librecon = ctypes.CDLL(libpath)
+librecon.reconSessionCreate.restype = ctypes.c_void_p
 
 # --------------------------------------------------------------------
 
@@ -61,6 +63,23 @@ class GridrecCStruct(ctypes.Structure):
                 ("RadonInterpolationLinear", ctypes.c_int)]
 
 class Gridrec():
+    """
+    Gridrec reconstruction.
+    
+    Each call to ``reconstruct`` sets up the native
+    reconstruction object (lookup tables, FFT plans) and
+    frees it afterwards. Used as a context manager, or
+    after ``open``, the object is kept and reused by all
+    calls with the same angles until ``close``::
+    
+        with Gridrec(data) as recon:
+            for center in centers:
+                recon.reconstruct(data, center, theta)
+                
+    ``XTomoDataset.gridrec`` reuses an open object given
+    as ``session`` (see ``XTomoDataset.gridrec_session``)
+    and writes to ``out`` if given (see ``reconstruct``).
+    """
     def __init__(self,
                  data,
                  sinoScale=1e4,
@@ -231,8 +250,60 @@ class Gridrec():
         self.params.RadonInterpolation = RadonInterpolation
         self.params.RadonInterpolationNone = 0
         self.params.RadonInterpolationLinear = 1
+        
+        # Native session, see ``open``.
+        self._session = None
+        self._theta = None
+        self._keep = False
 
-    def reconstruct(self, data, center, theta, slice_no=None):
+    def open(self, theta=None):
+        """
+        Keep the native reconstruction object between calls
+        to ``reconstruct`` until ``close`` is called.
+        
+        Parameters
+        ----------
+        theta : ndarray, optional
+            Projection angles. If given the object is
+            created now, otherwise by the first call.
+        """
+        self._keep = True
+        if theta is not None:
+            self._create(theta)
+        return self
+        
+    def close(self):
+        """
+        Release the native reconstruction object.
+        """
+        self._keep = False
+        if self._session is not None:
+            librecon.reconSessionDelete(ctypes.c_void_p(self._session))
+            self._session = None
+            self._theta = None
+            
+    def __enter__(self):
+        return self.open()
+        
+    def __exit__(self, *exc):
+        self.close()
+        
+    def _create(self, theta):
+        """
+        Create the native reconstruction object for
+        ``theta`` unless the open one already uses it.
+        """
+        theta = np.array(theta, dtype='float32', copy=False)
+        if self._session is not None:
+            if np.array_equal(theta, self._theta):
+                return
+            librecon.reconSessionDelete(ctypes.c_void_p(self._session))
+        self._theta = theta.copy()
+        self._session = librecon.reconSessionCreate(ctypes.byref(self.params),
+                self._theta.ctypes.data_as(ctypes.POINTER(ctypes.c_float)))
+
+    def reconstruct(self, data, center, theta, slice_no=None, out=None,
+                    sinogram_order=False):
         """
         Performs reconstruction using the tomographic data.
         
@@ -245,49 +316,170 @@ class Gridrec():
         
         Parameters
         ----------
-        TomoObj : tomopy data object
-            Tomopy data object generated by the Dataset() class.
+        data : ndarray
+            Projection data ordered as [projection, slice, pixel].
+            Float32 data with contiguous rows is read in place
+            through its strides, without a copy.
+            
+        center : scalar or ndarray
+            Rotation center, or one per slice (e.g. for a
+            tilted rotation axis).
+            
+        theta : ndarray
+            Projection angles.
         
-        slice_no : int, optional
-            If specified reconstructs only the slice defined by ``slice_no``.
+        slice_no : int or slice, optional
+            If specified reconstructs only the slice, or the
+            slices, defined by ``slice_no``.
+            
+        out : ndarray, optional
+            C-contiguous float32 array (or memmap) of shape
+            [slice, pixel, pixel] the slices are written to.
+            
+        sinogram_order : bool, optional
+            If ``True`` data is ordered as [slice, projection,
+            pixel] instead.
         
         Returns
         -------
         out : ndarray
-            Assigns reconstructed values in TomoRecon object as ``recon``.
+            Reconstructed slices, also kept as ``data_recon``.
             
         References
         ----------
         - `SPIE Proceedings, Vol 8506, 85060U(2012) \
         <http://dx.doi.org/10.1117/12.930022>`_
         """
-        # Change num_slices if slice_no is set.
-        num_slices = self.params.numSlices
-        if slice_no is not None:
-            num_slices = 1
+        # Select the slices as a [projection, slice, pixel] view.
+        if sinogram_order:
+            data = np.swapaxes(data, 0, 1)
+        if slice_no is None:
+            slice_no = slice(None)
+        elif not isinstance(slice_no, slice):
+            slice_no = slice(slice_no, slice_no+1)
+        datain = data[:, slice_no, :]
         
-        # Convert center to array.
-        if np.array(center).size == 1:
-            center = np.ones(num_slices) * center
-            center = np.array(center, dtype=np.float32, copy=False)
-
-        # Construct the reconstruction object.
-        librecon.reconCreate(ctypes.byref(self.params),
-                theta.ctypes.data_as(ctypes.POINTER(ctypes.c_float)))
+        # The native code reads float32 rows through the strides.
+        if datain.dtype != np.float32 or datain.strides[2] != datain.itemsize:
+            datain = np.array(datain, dtype='float32')
+        num_slices = datain.shape[1]
+        if num_slices > self.params.numSlices:
+            raise ValueError("can not reconstruct more than " + 
+                             str(self.params.numSlices) + " slices")
+        
+        # Convert center to one value per slice.
+        center = np.array(center, dtype=np.float32, ndmin=1).ravel()
+        if center.size == 1:
+            center = np.repeat(center, num_slices)
+        elif center.size != num_slices:
+            raise ValueError("center must be a scalar or have " + 
+                             "one value per slice")
+            
+        # Output slices.
+        shape = (num_slices, self.params.numPixels, self.params.numPixels)
+        if out is None:
+            out = np.zeros(shape, dtype='float32')
+        elif (out.shape != shape or out.dtype != np.float32 or 
+              not out.flags.c_contiguous):
+            raise ValueError("out must be a C-contiguous float32 " + 
+                             "array of shape " + str(shape))
+        self.data_recon = out
+
+        # Construct the reconstruction object or reuse the open one.
+        self._create(theta)
 
         # Prepare input variables by converting them to C-types.
         _num_slices = ctypes.c_int(num_slices)
-        datain = np.array(data[:, slice_no, :])
-        self.data_recon = np.zeros((num_slices,
-                                    self.params.numPixels,
-                                    self.params.numPixels), dtype='float32')
+        _slice_stride = ctypes.c_int(datain.strides[1] / datain.itemsize)
+        _projection_stride = ctypes.c_int(datain.strides[0] / datain.itemsize)
                                     
         # Go, go, go.
-        librecon.reconRun(ctypes.byref(_num_slices),
+        librecon.reconSessionRunStrided(ctypes.c_void_p(self._session),
+                ctypes.byref(_num_slices),
+                ctypes.byref(_slice_stride),
+                ctypes.byref(_projection_stride),
                 center.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
                 datain.ctypes.data_as(ctypes.POINTER(ctypes.c_float)),
                 self.data_recon.ctypes.data_as(ctypes.POINTER(ctypes.c_float)))
 
-        # Destruct the reconstruction object used by the wrapper.
-        librecon.reconDelete()
+        # Destruct the reconstruction object unless it is kept open.
+        if not self._keep:
+            self.close()
         return self.data_recon
+
+    def reconstruct_centers(self, data, center, theta, slice_no=0,
+                            metric=None, sinogram_order=False):
+        """
+        Reconstruct one slice at a series of rotation centers.
+        
+        The sinogram is not copied for each center: the
+        native code reads it through a zero slice stride.
+        Centers are reconstructed in batches of at most as
+        many slices as the object was set up for.
+        
+        Parameters
+        ----------
+        data : ndarray
+            Projection data, as for ``reconstruct``.
+            
+        center : ndarray
+            Rotation centers to try.
+            
+        theta : ndarray
+            Projection angles.
+            
+        slice_no : int, optional
+            Index of the slice to reconstruct.
+            
+        metric : callable, optional
+            Function of a reconstructed image returning a
+            quality value. If given only the values are
+            returned and only one batch of images is kept
+            at a time.
+            
+        sinogram_order : bool, optional
+            If ``True`` data is ordered as [slice, projection,
+            pixel] instead.
+            
+        Returns
+        -------
+        out : ndarray
+            Reconstructed images, one per center, or the
+            value of ``metric`` for each center.
+        """
+        center = np.array(center, dtype=np.float32, ndmin=1).ravel()
+        if sinogram_order:
+            data = np.swapaxes(data, 0, 1)
+        sino = data[:, slice_no:slice_no+1, :]
+        if sino.dtype != np.float32 or sino.strides[2] != sino.itemsize:
+            sino = np.array(sino, dtype='float32')
+        
+        # Enough centers per batch to keep all threads busy.
+        batch = max(1, min(self.params.numSlices, self.params.numThreads))
+        if metric is None:
+            out = np.zeros((center.size, 
+                            self.params.numPixels, 
+                            self.params.numPixels), dtype='float32')
+        else:
+            out = np.zeros(center.size, dtype='float32')
+            
+        keep = self._keep
+        self.open()
+        try:
+            for m in range(0, center.size, batch):
+                _center = center[m:m+batch]
+                
+                # The same sinogram for every center.
+                sinos = as_strided(sino, (sino.shape[0], _center.size, sino.shape[2]),
+                                   (sino.strides[0], 0, sino.strides[2]))
+                if metric is None:
+                    self.reconstruct(sinos, _center, theta, 
+                                     out=out[m:m+_center.size])
+                else:
+                    images = self.reconstruct(sinos, _center, theta)
+                    for n in range(_center.size):
+                        out[m+n] = metric(images[n])
+        finally:
+            if not keep:
+                self.close()
+        return out
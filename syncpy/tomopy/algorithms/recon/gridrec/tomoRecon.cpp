@@ -21,10 +21,12 @@ tomoRecon::tomoRecon(tomoParams_t *pTomoParams, float *pAngles)
    paddedWidth_(pTomoParams_->paddedSinogramWidth),
    numThreads_(pTomoParams_->numThreads),
    pAngles_(pAngles),
-   queueElements_((numSlices_+1)/2),
+   queueElements_(numSlices_),
    debug_(pTomoParams_->debug),
    reconComplete_(1),
-   shutDown_(0)
+   shutDown_(0),
+   sliceStride_(numPixels_),
+   projectionStride_(numPixels_*numSlices_)
 {
 
    char workerTaskName[20];
@@ -44,6 +46,15 @@ tomoRecon::tomoRecon(tomoParams_t *pTomoParams, float *pAngles)
    doneQueue_ = doneMsgQueue.MessageQueueCreate(queueElements_,
                                                 sizeof(doneMessage_t));
 
+   // Gridding objects are created by the first reconstruction
+   pGrids_ = new grid*[numThreads_];
+   reconSizes_ = new long[numThreads_];
+   for (i=0; i<numThreads_; i++)
+   {
+      pGrids_[i] = NULL;
+      reconSizes_[i] = 0;
+   }
+
 }
 
 /*---------------------------------------------------------------------------*/
@@ -59,21 +70,40 @@ tomoRecon::~tomoRecon()
    toDoMsgQueue.MessageQueueDestroy(toDoQueue_);
    doneMsgQueue.MessageQueueDestroy(doneQueue_);
 
+   for (i=0; i<numThreads_; i++)
+   {
+      if (pGrids_[i]) delete pGrids_[i];
+   }
+   delete[] pGrids_;
+   delete[] reconSizes_;
+
    if (debugFile_ != stdout) fclose(debugFile_);
 }
 
 /*---------------------------------------------------------------------------*/
 
 int tomoRecon::reconstruct(int numSlices, float *center, float *pInput, float *pOutput)
+{
+   return reconstructStrided(numSlices, numPixels_, numPixels_*numSlices,
+                             center, pInput, pOutput);
+}
+
+/*---------------------------------------------------------------------------*/
+
+/** Reconstructs slices read with arbitrary strides, for example a subset of
+* the slices of a [projection, slice, pixel] stack or a [slice, projection, pixel]
+* (sinogram ordered) array, without copying them first. Pixels of a row must
+* be contiguous. The output slices are contiguous. */
+int tomoRecon::reconstructStrided(int numSlices, int sliceStride, int projectionStride,
+                                  float *center, float *pInput, float *pOutput)
 {
 
    float *pIn, *pOut;
    toDoMessage_t toDoMessage;
    int reconSize = numPixels_ * numPixels_;
    int nextSlice=0;
-   int i;
    int status;
-   static const char *functionName="tomoRecon::reconstruct";
+   static const char *functionName="tomoRecon::reconstructStrided";
 
    // If a reconstruction is already in progress return an error
    if (debug_) logMsg("%s: entry, reconComplete_=%d", functionName, reconComplete_);
@@ -90,6 +120,8 @@ int tomoRecon::reconstruct(int numSlices, float *center, float *pInput, float *p
    }
   
    numSlices_ = numSlices;
+   sliceStride_ = sliceStride;
+   projectionStride_ = projectionStride;
    slicesRemaining_ = numSlices_;
    pInput_ = pInput;
    pOutput_ = pOutput;
@@ -98,21 +130,23 @@ int tomoRecon::reconstruct(int numSlices, float *center, float *pInput, float *p
 
    reconComplete_ = 0;
 
-   // Fill up the toDoQueue with slices to be reconstructed
-   for (i=0; i<(numSlices_+1)/2; i++)
+   // Fill up the toDoQueue with slices to be reconstructed. Slices are
+   // reconstructed in pairs when they share the same center, otherwise
+   // (e.g. a tilted axis or a center sweep) one at a time.
+   while (nextSlice < numSlices_)
    {
      toDoMessage.sliceNumber = nextSlice;
      toDoMessage.pIn1 = pIn;
      toDoMessage.pOut1 = pOut;
-     toDoMessage.center = center[i*2] + (paddedWidth_ - numPixels_)/2.;
-     pIn += numPixels_;
+     toDoMessage.center = center[nextSlice] + (paddedWidth_ - numPixels_)/2.;
+     pIn += sliceStride_;
      pOut += reconSize;
      nextSlice++;
-     if (nextSlice < numSlices_)
+     if ((nextSlice < numSlices_) && (center[nextSlice] == center[nextSlice-1]))
      {
        toDoMessage.pIn2 = pIn;
        toDoMessage.pOut2 = pOut;
-       pIn += numPixels_;
+       pIn += sliceStride_;
        pOut += reconSize;
        nextSlice++;
      } else
@@ -210,7 +244,14 @@ void tomoRecon::workerTask(int taskNum)
 
    m_mutex.lock();
 
-   pGrid = new grid(&gridStruct, &sgStruct, &reconSize);
+   // The lookup tables and FFT plans of the gridding object only
+   // depend on the parameters, so it is reused by later calls
+   if (pGrids_[taskNum] == NULL)
+   {
+      pGrids_[taskNum] = new grid(&gridStruct, &sgStruct, &reconSizes_[taskNum]);
+   }
+   pGrid = pGrids_[taskNum];
+   reconSize = reconSizes_[taskNum];
 
    m_mutex.unlock();
 
@@ -337,7 +378,6 @@ void tomoRecon::workerTask(int taskNum)
    if (S2) free(S2);
    if (R1) free(R1);
    if (R2) free(R2);
-   if (pGrid) delete pGrid;
 
 }
 
@@ -365,7 +405,7 @@ void tomoRecon::sinogram(float *pIn, float *pOut)
   
    for (i=0, pInData=pIn, pOutData=pOut;
         i<numProjections_;
-        i++, pInData+=numPixels_*numSlices_, pOutData+=paddedWidth_)
+        i++, pInData+=projectionStride_, pOutData+=paddedWidth_)
    {
       if (numAir > 0)
       {
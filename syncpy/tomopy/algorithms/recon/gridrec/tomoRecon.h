@@ -112,6 +112,8 @@ public:
    tomoRecon(tomoParams_t *pTomoParams, float *pAngles);
    virtual ~tomoRecon();
    virtual int reconstruct(int numSlices, float *center, float *pInput, float *pOutput);
+   virtual int reconstructStrided(int numSlices, int sliceStride, int projectionStride,
+                                  float *center, float *pInput, float *pOutput);
    virtual void workerTask(int taskNum);
    virtual void sinogram(float *pIn, float *pOut);
    virtual void poll(int *pReconComplete, int *pSlicesRemaining);
@@ -134,6 +136,10 @@ private:
    int reconComplete_;
    int slicesRemaining_;
    int shutDown_;
+   int sliceStride_;      /**< Distance in floats between two slices of the input */
+   int projectionStride_; /**< Distance in floats between two projections of the input */
+   grid **pGrids_;        /**< Gridding object of each workerTask, kept between calls to reconstruct */
+   long *reconSizes_;     /**< Reconstruction size of each gridding object */
 
    MessageQueue toDoMsgQueue;
    MessageQueue doneMsgQueue;
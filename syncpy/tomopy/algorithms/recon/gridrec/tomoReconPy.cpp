@@ -40,6 +40,56 @@ void reconRun(int *numSlices,
     pTomoRecon -> reconstruct(*numSlices, pCenter, pIn, pOut);
 }
 
+/* Sessions own their copy of the parameters and angles, so several
+   of them can be kept open and reused for many calls to reconRun. */
+typedef struct {
+    tomoRecon *pTomoRecon;
+    tomoParams_t tomoParams;
+    float *angles;
+} reconSession_t;
+
+void *reconSessionCreate(tomoParams_t *pTomoParams, float *pAngles)
+{
+    reconSession_t *pSession = new reconSession_t;
+    memcpy(&pSession->tomoParams, pTomoParams, sizeof(tomoParams_t));
+    pSession->angles = (float *)malloc(pTomoParams->numProjections*sizeof(float));
+    memcpy(pSession->angles, pAngles, pTomoParams->numProjections*sizeof(float));
+    pSession->pTomoRecon = new tomoRecon(&pSession->tomoParams, pSession->angles);
+    return (void *)pSession;
+}
+
+void reconSessionRun(void *pSession,
+                     int *numSlices,
+                     float *pCenter,
+                     float *pIn,
+                     float *pOut)
+{
+    if (pSession == NULL) return;
+    ((reconSession_t *)pSession) -> pTomoRecon -> reconstruct(*numSlices, pCenter, pIn, pOut);
+}
+
+void reconSessionRunStrided(void *pSession,
+                            int *numSlices,
+                            int *sliceStride,
+                            int *projectionStride,
+                            float *pCenter,
+                            float *pIn,
+                            float *pOut)
+{
+    if (pSession == NULL) return;
+    ((reconSession_t *)pSession) -> pTomoRecon -> reconstructStrided(*numSlices,
+        *sliceStride, *projectionStride, pCenter, pIn, pOut);
+}
+
+void reconSessionDelete(void *pSession)
+{
+    reconSession_t *p = (reconSession_t *)pSession;
+    if (p == NULL) return;
+    delete p->pTomoRecon;
+    free(p->angles);
+    delete p;
+}
+
 void reconPoll(int *pReconComplete,
                int *pSlicesRemaining)
 {
@@ -3,8 +3,12 @@
 #include <math.h>
 #include <stdbool.h>
 
+/* Detector bins of the data lie in the middle of num_pad
+   bins. Bins outside it are virtual padding: zero, or the
+   nearest edge value of the data if pad_edge is set. */
 void mlem(float* data, float* theta, float center, 
           int num_projections, int num_slices, int num_pixels, 
+          int num_pad, int pad_edge,
           int num_grid, int iters, float* recon) {
               
     float* gridx = (float *)malloc((num_grid+1)*sizeof(float));
@@ -32,7 +36,9 @@ void mlem(float* data, float* theta, float center,
     int alen, blen, len;
     int i1, i2;
     float x1, x2;
-    int io;
+    int io, pix, pad_width;
+    bool inside;
+    float measured;
     float simdata;
     float srcx, srcy, detx, dety;
     float midx, midy, diffx, diffy;
@@ -41,7 +47,8 @@ void mlem(float* data, float* theta, float center,
     float mov;
     
         
-    mov = num_pixels/2 - center;
+    pad_width = (num_pad-num_pixels)/2;
+    mov = num_pad/2 - center;
     if (mov-ceil(mov) < 1e-6) {
         mov += 1e-6;
     }
@@ -71,10 +78,19 @@ void mlem(float* data, float* theta, float center,
                 quadrant = false;
             }
 
-            for (m = 0; m < num_pixels; m++) {
+            for (m = 0; m < num_pad; m++) {
+                
+                pix = m - pad_width;
+                inside = (pix >= 0 && pix < num_pixels);
+                if (pix < 0) {
+                    pix = 0;
+                }
+                if (pix >= num_pixels) {
+                    pix = num_pixels - 1;
+                }
                 
                 xi = 1e6;
-                yi = -(num_pixels-1)/2. + m + mov;
+                yi = -(num_pad-1)/2. + m + mov;
 
                 srcx = xi * cosq - yi * sinq;
                 srcy = xi * sinq + yi * cosq;
@@ -206,7 +222,8 @@ void mlem(float* data, float* theta, float center,
                 
                 for (k = 0; k < num_slices; k++) {
                     i = k * num_grid * num_grid;
-                    io = iproj + m + (k * num_pixels);
+                    io = iproj + pix + (k * num_pixels);
+                    measured = (inside || pad_edge) ? fabs(data[io]) : 0;
                     
                     simdata = 0;
                     for (n = 0; n < len-1; n++) {
@@ -214,7 +231,7 @@ void mlem(float* data, float* theta, float center,
                     }
                     
                     for (n = 0; n < len-1; n++) {
-                        sumay[indi[n]+i] += (data[io] / simdata) * leng[n];
+                        sumay[indi[n]+i] += (measured / simdata) * leng[n];
                     }
                 }
             }
@@ -1,21 +1,37 @@
 # -*- coding: utf-8 -*-
 import numpy as np
-from scipy.optimize import minimize
+from numpy.lib.stride_tricks import as_strided
 from scipy import ndimage
 
 from gridrec import Gridrec
+from syncpy.tomopy.algorithms.preprocess.downsample import _downsample2d
 
 # --------------------------------------------------------------------
 
-def _optimize_center(data, theta, slice_no, center_init, tol):
+# Largest number of centers tried by the coarse sweep.
+COARSE_CENTERS = 64
+
+# Smallest width in pixels of the binned sinogram.
+MIN_BINNED_PIXELS = 64
+
+# Interval reduction of the golden-section search.
+GOLDEN = (np.sqrt(5) - 1) / 2
+
+# --------------------------------------------------------------------
+
+def _optimize_center(data, theta, slice_no, center_init, tol,
+                     level=2, search=None, fluorescence=0):
     """ 
     Find the distance between the rotation axis and the middle
     of the detector field-of-view.
     
     The function exploits systematic artifacts in reconstructed images 
     due to shifts in the rotation center [1]. It uses image entropy
-    as the error metric and ''Nelder-Mead'' routine (of the scipy 
-    optimization module) as the optimizer.
+    as the error metric. Centers are first swept broadly on
+    data binned by ``2**level`` pixels, all of them in one
+    batch. The best of them is then refined at full resolution
+    by a golden-section search, which needs only a few
+    reconstructions.
 
     Parameters
     ----------
@@ -26,11 +42,29 @@ def _optimize_center(data, theta, slice_no, center_init, tol):
         The index of the slice to be used for finding optimal center.
 
     center_init : scalar
-        The initial guess for the center.
+        The initial guess for the center. If ``None`` it is
+        found by cross-correlating the projections at 0 and
+        180 degrees, or else set to the middle of the detector.
 
     tol : scalar
         Desired sub-pixel accuracy.
 
+    level : scalar, optional
+        Binning level of the coarse sweep. It is lowered if
+        the binned sinogram would be narrower than
+        ``MIN_BINNED_PIXELS``.
+
+    search : scalar, optional
+        Half width in pixels of the coarse sweep. Defaults to
+        a quarter of the detector, or to four binned pixels
+        around a cross-correlation guess. Wide sweeps try
+        centers more than one binned pixel apart, so that
+        there are no more than ``COARSE_CENTERS`` of them.
+
+    fluorescence : scalar, optional
+        0=absorption data, 1=data that already holds the
+        minus log, which Gridrec then takes as it is.
+
     Returns
     -------
     optimal_center : scalar
@@ -42,41 +76,198 @@ def _optimize_center(data, theta, slice_no, center_init, tol):
     [1] `SPIE Proceedings, Vol 6318, 631818(2006) \
     <dx.doi.org/10.1117/12.679101>`_
     """
-    # Make an initial reconstruction to adjust histogram limits. 
-    recon = Gridrec(data, airPixels=20, ringWidth=10)
-    recon.reconstruct(data, theta=theta, center=center_init, slice_no=slice_no)
-    
+    num_pixels = data.shape[2]
+    while level > 0 and num_pixels / 2 ** level < MIN_BINNED_PIXELS:
+        level -= 1
+    binsize = 2 ** level
+    sino = np.array(data[:, slice_no:slice_no+1, :], dtype='float32')
+
+    # Initial guess.
+    if center_init is None:
+        center_init = _pair_center(data, theta)
+        if center_init is None:
+            center_init = num_pixels / 2.
+        elif search is None:
+            search = 4 * binsize
+        print "initial rotation center: " + str(center_init)
+    if search is None:
+        search = num_pixels / 4.
+    center_init = float(np.squeeze(center_init))
+
+    # Broad search on binned data...
+    center, step = _sweep_center(sino, theta, center_init, search, level,
+                                 fluorescence)
+
+    # ...then refine it at full resolution. The coarse best
+    # can be a step or more off, so look two steps around it.
+    center = _refine_center(sino, theta, center, 2 * step, tol, fluorescence)
+
+    # Have a look at what I found:
+    print "calculated rotation center: " + str(center)
+    return center
+
+# --------------------------------------------------------------------
+
+def _sweep_center(sino, theta, center, search, level, fluorescence=0):
+    """
+    Center of least entropy within ``search`` pixels of
+    ``center`` on the sinogram binned by ``2**level`` pixels,
+    and the distance in pixels between the centers tried.
+    They are one binned pixel apart, or more if that would
+    take over ``COARSE_CENTERS`` of them.
+    """
+    binsize = 2 ** level
+    if binsize > 1:
+        num_pixels = sino.shape[2] - sino.shape[2] % binsize
+        sino = _downsample2d((sino[:, :, :num_pixels],
+                              np.array(level, dtype='int32'),
+                              0, sino.shape[0]))[2]
+
+    # Candidate centers in binned pixels.
+    center = (center + 0.5) / binsize - 0.5
+    radius = float(search) / binsize
+    step = max(1., 2 * radius / COARSE_CENTERS)
+    centers = np.arange(center - radius, center + radius + step / 2., step)
+
+    # Set up for one batch of centers on the same sinogram.
+    sinos = as_strided(sino, (sino.shape[0], centers.size, sino.shape[2]),
+                       (sino.strides[0], 0, sino.strides[2]))
+    with Gridrec(sinos, airPixels=max(1, 20 / binsize),
+                 ringWidth=10 / binsize,
+                 fluorescence=fluorescence) as recon:
+        # Make an initial reconstruction to adjust histogram limits. 
+        recon.reconstruct(sino, theta=theta, center=center)
+        hist_min, hist_max = _hist_limits(recon.data_recon)
+
+        # Magic is ready to happen...
+        entropy = recon.reconstruct_centers(sino, centers, theta,
+                                            metric=_entropy(hist_min, hist_max))
+    center = (centers[np.argmin(entropy)] + 0.5) * binsize - 0.5
+    print 'best center at binning ' + str(binsize) + ': ' + str(center)
+    return center, step * binsize
+
+# --------------------------------------------------------------------
+
+def _refine_center(sino, theta, center, search, tol, fluorescence=0):
+    """
+    Center of least entropy around ``center`` at full
+    resolution. The interval of ``search`` pixels on each
+    side is moved until its middle is better than both its
+    ends, and then shrunk by golden-section search down to
+    ``tol`` pixels.
+    """
+    num_pixels = sino.shape[2]
+    with Gridrec(sino, airPixels=20, ringWidth=10,
+                 fluorescence=fluorescence) as recon:
+        # Make an initial reconstruction to adjust histogram limits. 
+        recon.reconstruct(sino, theta=theta, center=center)
+        hist_min, hist_max = _hist_limits(recon.data_recon)
+        metric = _entropy(hist_min, hist_max)
+        
+        def cost(center):
+            print 'trying center: ' + str(center)
+            return metric(recon.reconstruct(sino, center, theta)[0])
+        
+        # Move the interval while an end of it is the best.
+        a, b = center - search, center + search
+        cost_a, cost_m, cost_b = cost(a), cost(center), cost(b)
+        while min(cost_a, cost_b) < cost_m and 0 < a and b < num_pixels:
+            if cost_a < cost_b:
+                b, cost_b = center, cost_m
+                center, cost_m = a, cost_a
+                a = center - search
+                cost_a = cost(a)
+            else:
+                a, cost_a = center, cost_m
+                center, cost_m = b, cost_b
+                b = center + search
+                cost_b = cost(b)
+        
+        # Shrink the interval around the minimum, one
+        # reconstruction per step.
+        c, d = b - GOLDEN * (b - a), a + GOLDEN * (b - a)
+        cost_c, cost_d = cost(c), cost(d)
+        while b - a > tol:
+            if cost_c < cost_d:
+                b, d, cost_d = d, c, cost_c
+                c = b - GOLDEN * (b - a)
+                cost_c = cost(c)
+            else:
+                a, c, cost_c = c, d, cost_d
+                d = a + GOLDEN * (b - a)
+                cost_d = cost(d)
+    return (a + b) / 2.
+
+# --------------------------------------------------------------------
+
+def _pair_center(data, theta):
+    """
+    Rotation center from the cross-correlation of the
+    projections closest to 0 and 180 degrees, which mirror
+    each other about the rotation axis. Returns ``None`` if
+    the scan has no such pair of projections.
+    """
+    theta = np.array(theta, dtype='float64')
+    if np.max(np.abs(theta)) <= 2 * np.pi: # then theta is in radians.
+        theta = theta * 180 / np.pi
+
+    # Projection opposite to the first one.
+    ind = np.argmin(np.abs(theta - theta[0] - 180))
+    theta_step = np.median(np.abs(np.diff(theta)))
+    if ind == 0 or abs(theta[ind] - theta[0] - 180) > theta_step:
+        return None
+
+    # The mirrored opposite projection is the first one
+    # shifted by 2 * center - (num_pixels - 1) pixels.
+    num_pixels = data.shape[2]
+    proj0 = np.array(data[0], dtype='float32')
+    proj180 = np.array(data[ind, :, ::-1], dtype='float32')
+    proj0 -= np.mean(proj0, axis=1)[:, np.newaxis]
+    proj180 -= np.mean(proj180, axis=1)[:, np.newaxis]
+    corr = np.fft.rfft(proj0, 2 * num_pixels, axis=1)
+    corr *= np.conj(np.fft.rfft(proj180, 2 * num_pixels, axis=1))
+    corr = np.sum(np.fft.irfft(corr, 2 * num_pixels, axis=1), axis=0)
+
+    # Sub-pixel peak from a parabola through its neighbours.
+    ind = np.argmax(corr)
+    y0, y1, y2 = corr[ind-1], corr[ind], corr[(ind+1) % corr.size]
+    shift = float(ind)
+    if ind >= num_pixels:
+        shift -= corr.size
+    if y0 - 2 * y1 + y2 != 0:
+        shift += 0.5 * (y0 - y2) / (y0 - 2 * y1 + y2)
+    return (shift + num_pixels - 1) / 2.
+
+# --------------------------------------------------------------------
+
+def _hist_limits(data_recon):
+    """
+    Histogram limits of the entropy metric, set wider
+    than the values of an initial reconstruction.
+    """
     # Adjust histogram boundaries according to reconstruction.
-    hist_min = np.min(recon.data_recon)
+    hist_min = np.min(data_recon)
     if hist_min < 0:
         hist_min = 2 * hist_min
     elif hist_min >= 0:
         hist_min = 0.5 * hist_min
-        
-    hist_max = np.max(recon.data_recon)
+
+    hist_max = np.max(data_recon)
     if hist_max < 0:
         hist_max = 0.5 * hist_max
     elif hist_max >= 0:
         hist_max = 2 * hist_max
+    return hist_min, hist_max
 
-    # Magic is ready to happen...
-    res = minimize(_costFunc, center_init,
-                   args=(data, recon, theta, slice_no, hist_min, hist_max),
-                   method='Nelder-Mead', tol=tol)
-    
-    # Have a look at what I found:
-    print "calculated rotation center: " + str(np.squeeze(res.x))
-    return res.x
-    
 # --------------------------------------------------------------------
 
-def _costFunc(center, data, recon, theta, slice_no, hist_min, hist_max):
+def _entropy(hist_min, hist_max):
     """ 
-    Cost function of the ``optimize_center``.
+    Image entropy metric of the ``optimize_center``.
     """
-    print 'trying center: ' + str(np.squeeze(center))
-    recon.reconstruct(data, theta=theta, center=center, slice_no=slice_no)
-    histr, e = np.histogram(ndimage.filters.gaussian_filter(recon.data_recon, sigma=2.), 
-                            bins=64, range=[hist_min, hist_max])
-    histr = histr.astype('float32') / recon.data_recon.size + 1e-12
-    return -np.dot(histr, np.log2(histr))
\ No newline at end of file
+    def metric(image):
+        histr, e = np.histogram(ndimage.filters.gaussian_filter(image, sigma=2.), 
+                                bins=64, range=[hist_min, hist_max])
+        histr = histr.astype('float32') / image.size + 1e-12
+        return -np.dot(histr, np.log2(histr))
+    return metric
\ No newline at end of file
@@ -65,4 +65,63 @@ extern "C" {
         else             fftwf_execute(backward_plan);
         memcpy(data, in, nx*ny*sizeof(fftwf_complex));
     }
+    
+    /* Batched 2-D transforms of howmany images of ny by nx 
+       pixels stored one after another. kind is one of:
+       0: complex forward, 1: complex backward,
+       2: real to complex (ny by nx/2+1 outputs),
+       3: complex to real (overwrites its input).
+       Plans are made on scratch buffers and executed later on
+       any arrays with the new-array interface, so one plan
+       can serve all chunks of the same shape. */
+    void *plan_many_2d (int howmany, int ny, int nx, int kind, int inplace)
+    {
+        int n[2] = {ny, nx};
+        int nc = ny*(nx/2+1);
+        unsigned flags = FFTW_MEASURE | FFTW_UNALIGNED;
+        fftwf_plan plan = NULL;
+        
+        if (kind == 0 || kind == 1) {
+            fftwf_complex *in, *out;
+            in = (fftwf_complex *)fftwf_malloc(sizeof(fftwf_complex)*howmany*ny*nx);
+            out = inplace ? in : (fftwf_complex *)fftwf_malloc(sizeof(fftwf_complex)*howmany*ny*nx);
+            plan = fftwf_plan_many_dft(2, n, howmany, in, NULL, 1, ny*nx,
+                                       out, NULL, 1, ny*nx,
+                                       kind == 0 ? FFTW_FORWARD : FFTW_BACKWARD, flags);
+            if (out != in) fftwf_free(out);
+            fftwf_free(in);
+        }
+        else if (kind == 2) {
+            float *in = (float *)fftwf_malloc(sizeof(float)*howmany*ny*nx);
+            fftwf_complex *out = (fftwf_complex *)fftwf_malloc(sizeof(fftwf_complex)*howmany*nc);
+            plan = fftwf_plan_many_dft_r2c(2, n, howmany, in, NULL, 1, ny*nx,
+                                           out, NULL, 1, nc, flags);
+            fftwf_free(out);
+            fftwf_free(in);
+        }
+        else if (kind == 3) {
+            fftwf_complex *in = (fftwf_complex *)fftwf_malloc(sizeof(fftwf_complex)*howmany*nc);
+            float *out = (float *)fftwf_malloc(sizeof(float)*howmany*ny*nx);
+            plan = fftwf_plan_many_dft_c2r(2, n, howmany, in, NULL, 1, nc,
+                                           out, NULL, 1, ny*nx, flags);
+            fftwf_free(out);
+            fftwf_free(in);
+        }
+        return (void *)plan;
+    }
+    
+    void execute_many_2d (void *plan, int kind, float *in, float *out)
+    {
+        if (kind == 0 || kind == 1)
+            fftwf_execute_dft((fftwf_plan)plan, (fftwf_complex *)in, (fftwf_complex *)out);
+        else if (kind == 2)
+            fftwf_execute_dft_r2c((fftwf_plan)plan, in, (fftwf_complex *)out);
+        else if (kind == 3)
+            fftwf_execute_dft_c2r((fftwf_plan)plan, (fftwf_complex *)in, out);
+    }
+    
+    void destroy_many_2d (void *plan)
+    {
+        fftwf_destroy_plan((fftwf_plan)plan);
+    }
 } // extern "C"
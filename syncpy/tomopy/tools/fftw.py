@@ -5,11 +5,28 @@ Module for FFTW wrappers.
 import ctypes
 import numpy as np
 import os
+import threading
 
 # --------------------------------------------------------------------
 
+# NumPy FFT is used as a fallback if the library is not built.
 libpath = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'lib/libfftw.so'))
-libfftw = ctypes.CDLL(libpath)
+try:
+    libfftw = ctypes.CDLL(libpath)
+    libfftw.plan_many_2d.restype = ctypes.c_void_p
+except (OSError, AttributeError):
+    libfftw = None
+
+# Transform kinds of the batched C interface.
+_FORWARD = 0
+_BACKWARD = 1
+_REAL_FORWARD = 2
+_REAL_BACKWARD = 3
+
+# Cached FFTW plans keyed by (kind, shape, inplace). The FFTW
+# planner is not thread-safe, executing plans is.
+_plans = {}
+_plan_lock = threading.Lock()
 
 # --------------------------------------------------------------------
 
@@ -43,6 +60,9 @@ def fftw(a):
     symmetric, that is highest when the array sizes are 
     powers of 2.
     """
+    if libfftw is None:
+        return np.array(np.fft.fft(a), dtype='complex64')
+        
     c_float_p = ctypes.POINTER(ctypes.c_float)
     c_int_p = ctypes.POINTER(ctypes.c_int)
 
@@ -80,6 +100,9 @@ def ifftw(a):
     fftw : The one-dimensional FFT.
     fftw2 : The two-dimensional FFT.
     """
+    if libfftw is None: # Not normalized, as FFTW.
+        return np.array(np.fft.ifft(a) * a.shape[-1], dtype='complex64')
+        
     c_float_p = ctypes.POINTER(ctypes.c_float)
     c_int_p = ctypes.POINTER(ctypes.c_int)
     
@@ -124,6 +147,9 @@ def fftw2(a):
     symmetric, that is highest when the array sizes are
     powers of 2.
     """
+    if libfftw is None:
+        return np.array(np.fft.fft2(a), dtype='complex64')
+        
     c_float_p = ctypes.POINTER(ctypes.c_float)
     c_int_p = ctypes.POINTER(ctypes.c_int)
     
@@ -163,6 +189,10 @@ def ifftw2(a):
     fftw : The one-dimensional FFT.
     fftw2 : The two-dimensional FFT.
     """
+    if libfftw is None: # Not normalized, as FFTW.
+        return np.array(np.fft.ifft2(a) * a.shape[0] * a.shape[1], 
+                        dtype='complex64')
+        
     c_float_p = ctypes.POINTER(ctypes.c_float)
     c_int_p = ctypes.POINTER(ctypes.c_int)
     
@@ -175,4 +205,227 @@ def ifftw2(a):
                       dimy.ctypes.data_as(c_int_p),
                       direction.ctypes.data_as(c_int_p))
     #_a /= (dimx * dimy)
-    return _a
\ No newline at end of file
+    return _a
+
+# --------------------------------------------------------------------
+
+def fftw2_many(a, out=None):
+    """
+    Compute the two-dimensional discrete Fourier Transform
+    of every image in a stack.
+    
+    All images are transformed with a single batched FFTW
+    plan, which is created once for each stack shape and
+    kept for later calls.
+    
+    Parameters
+    ----------
+    a : array_like
+        Input array of images stacked along the leading
+        dimensions: [..., rows, columns].
+        
+    out : complex64 ndarray, optional
+        Contiguous output array of the same shape. It can
+        be ``a`` itself for an in-place transform.
+    
+    Returns
+    -------
+    out : complex ndarray
+        Output array.
+        
+    See Also
+    --------
+    ifftw2_many : The inverse of `fftw2_many`.
+    rfftw2 : The real-input batched FFT.
+    """
+    return _execute(_FORWARD, a, out)
+
+# --------------------------------------------------------------------
+
+def ifftw2_many(a, out=None):
+    """
+    Compute the two-dimensional inverse discrete Fourier 
+    Transform of every image in a stack. As with `ifftw2`
+    the result is not divided by the number of pixels.
+    
+    Parameters
+    ----------
+    a : array_like
+        Input array of images stacked along the leading
+        dimensions: [..., rows, columns].
+        
+    out : complex64 ndarray, optional
+        Contiguous output array of the same shape. It can
+        be ``a`` itself for an in-place transform.
+    
+    Returns
+    -------
+    out : complex ndarray
+        Output array.
+        
+    See Also
+    --------
+    fftw2_many : The batched two-dimensional FFT.
+    """
+    return _execute(_BACKWARD, a, out)
+
+# --------------------------------------------------------------------
+
+def rfftw2(a, out=None):
+    """
+    Compute the two-dimensional discrete Fourier Transform
+    of every real image in a stack. Only the non-negative
+    frequencies of the last dimension are returned.
+    
+    Parameters
+    ----------
+    a : array_like
+        Real input array of images stacked along the
+        leading dimensions: [..., rows, columns].
+        
+    out : complex64 ndarray, optional
+        Contiguous output array of shape
+        [..., rows, columns/2+1].
+    
+    Returns
+    -------
+    out : complex ndarray
+        Output array.
+        
+    See Also
+    --------
+    irfftw2 : The inverse of `rfftw2`.
+    """
+    return _execute(_REAL_FORWARD, a, out)
+
+# --------------------------------------------------------------------
+
+def irfftw2(a, num_columns, out=None):
+    """
+    Compute the two-dimensional inverse discrete Fourier
+    Transform of every half spectrum in a stack, giving
+    real images. As with `ifftw2` the result is not
+    divided by the number of pixels. The input array
+    is overwritten.
+    
+    Parameters
+    ----------
+    a : complex64 ndarray
+        Half spectra stacked along the leading
+        dimensions: [..., rows, columns/2+1].
+        
+    num_columns : scalar
+        Number of columns of the real images.
+        
+    out : float32 ndarray, optional
+        Contiguous output array of shape
+        [..., rows, columns].
+    
+    Returns
+    -------
+    out : ndarray
+        Output array.
+        
+    See Also
+    --------
+    rfftw2 : The real-input batched FFT.
+    """
+    return _execute(_REAL_BACKWARD, a, out, num_columns)
+
+# --------------------------------------------------------------------
+
+def clear_plans():
+    """
+    Destroy all cached FFTW plans.
+    """
+    with _plan_lock:
+        if libfftw is not None:
+            for plan in _plans.values():
+                libfftw.destroy_many_2d(ctypes.c_void_p(plan))
+        _plans.clear()
+
+# --------------------------------------------------------------------
+
+def _get_plan(kind, shape, inplace):
+    """
+    Batched plan for ``shape`` = (howmany, rows, columns)
+    of the real-space images, created at first use.
+    """
+    key = (kind, shape, inplace)
+    with _plan_lock:
+        plan = _plans.get(key)
+        if plan is None:
+            howmany, ny, nx = shape
+            plan = libfftw.plan_many_2d(ctypes.c_int(howmany),
+                                        ctypes.c_int(ny),
+                                        ctypes.c_int(nx),
+                                        ctypes.c_int(kind),
+                                        ctypes.c_int(inplace))
+            if not plan:
+                raise RuntimeError("FFTW could not plan a transform of " + 
+                                   str(shape))
+            _plans[key] = plan
+    return plan
+
+# --------------------------------------------------------------------
+
+def _execute(kind, a, out, num_columns=None):
+    """
+    Run a batched transform of the given kind.
+    """
+    if kind == _REAL_FORWARD:
+        a = np.ascontiguousarray(a, dtype='float32')
+        out_shape = a.shape[:-1] + (a.shape[-1] // 2 + 1,)
+        out_dtype = 'complex64'
+    elif kind == _REAL_BACKWARD:
+        a = np.ascontiguousarray(a, dtype='complex64')
+        out_shape = a.shape[:-1] + (num_columns,)
+        out_dtype = 'float32'
+    else:
+        a = np.ascontiguousarray(a, dtype='complex64')
+        out_shape = a.shape
+        out_dtype = 'complex64'
+    if out is None:
+        out = np.empty(out_shape, dtype=out_dtype)
+    elif (out.shape != out_shape or out.dtype != np.dtype(out_dtype) or
+          not out.flags['C_CONTIGUOUS']):
+        raise ValueError("out must be a contiguous " + out_dtype + 
+                         " array of shape " + str(out_shape))
+    
+    # Real-space image size.
+    if kind == _REAL_BACKWARD:
+        ny, nx = out_shape[-2:]
+    else:
+        ny, nx = a.shape[-2:]
+    howmany = int(np.prod(a.shape[:-2]))
+    if howmany == 0:
+        return out
+        
+    if libfftw is None:
+        _execute_numpy(kind, a, out, ny, nx)
+        return out
+        
+    inplace = int(a.ctypes.data == out.ctypes.data)
+    plan = _get_plan(kind, (howmany, ny, nx), inplace)
+    
+    c_float_p = ctypes.POINTER(ctypes.c_float)
+    libfftw.execute_many_2d(ctypes.c_void_p(plan), ctypes.c_int(kind),
+                            a.ctypes.data_as(c_float_p),
+                            out.ctypes.data_as(c_float_p))
+    return out
+
+# --------------------------------------------------------------------
+
+def _execute_numpy(kind, a, out, ny, nx):
+    """
+    NumPy version of ``_execute`` with the
+    same (unnormalized) conventions.
+    """
+    if kind == _FORWARD:
+        out[:] = np.fft.fft2(a)
+    elif kind == _BACKWARD:
+        out[:] = np.fft.ifft2(a) * (ny * nx)
+    elif kind == _REAL_FORWARD:
+        out[:] = np.fft.rfft2(a)
+    elif kind == _REAL_BACKWARD:
+        out[:] = np.fft.irfft2(a, s=(ny, nx)) * (ny * nx)
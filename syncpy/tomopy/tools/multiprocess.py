@@ -4,6 +4,119 @@ Module for multiprocessing.
 """
 import numpy as np
 import multiprocessing as mp
+import os
+import sys
+import tempfile
+import threading
+import traceback
+from Queue import Empty, Queue
+
+# --------------------------------------------------------------------
+
+# Shared buffers are placed in RAM-backed tmpfs whenever it is available.
+if os.path.isdir('/dev/shm'):
+    SHARED_DIR = '/dev/shm'
+else:
+    SHARED_DIR = tempfile.gettempdir()
+
+# Automatic chunking: number of work units queued per core, and the
+# largest chunk in bytes a single unit should hold.
+JOBS_PER_CORE = 4
+CHUNK_BYTES = 32 * 1024 * 1024
+
+# --------------------------------------------------------------------
+
+class SharedArray(np.memmap):
+    """
+    Array living in a memory-mapped file that all worker
+    processes can map by name. The backing file is removed
+    when the array that created it is garbage collected.
+    """
+    def __del__(self):
+        if getattr(self, '_owner', False):
+            self._owner = False
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+
+# --------------------------------------------------------------------
+
+def shared_array(shape, dtype='float32'):
+    """
+    Allocate an uninitialized array in shared memory.
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the array.
+
+    dtype : str, optional
+        Data type of the array.
+
+    Returns
+    -------
+    out : SharedArray
+        Memory-mapped array that can be handed to
+        ``distribute_jobs`` without copying.
+    """
+    fd, file_name = tempfile.mkstemp(prefix='tomopy-', suffix='.dat',
+                                     dir=SHARED_DIR)
+    os.close(fd)
+    arr = SharedArray(file_name, dtype=dtype, mode='w+', shape=tuple(shape))
+    arr._owner = True
+    return arr
+
+# --------------------------------------------------------------------
+
+def as_shared(data, dtype=None):
+    """
+    Return ``data`` as a shared array, copying it only
+    if it does not already live in shared memory.
+    """
+    if dtype is None:
+        dtype = data.dtype
+    if (isinstance(data, SharedArray) and
+        data.dtype == np.dtype(dtype) and
+        data.flags['C_CONTIGUOUS']):
+        return data
+    arr = shared_array(data.shape, dtype)
+    arr[:] = data
+    return arr
+
+# --------------------------------------------------------------------
+
+class SharedHandle(object):
+    def __init__(self, data, axis):
+        """
+        Light-weight reference to a shared array that is
+        sent to workers instead of the data itself.
+        """
+        self.filename = data.filename
+        
+        # Views keep the offset of the array they were taken
+        # from, so add how far into it their data starts.
+        base = data
+        while isinstance(base.base, np.ndarray):
+            base = base.base
+        self.offset = data.offset + data.ctypes.data - base.ctypes.data
+        self.dtype = data.dtype.str
+        self.shape = data.shape
+        self.axis = axis
+
+    def view(self, ind_start, ind_end):
+        """
+        Map the shared array and return the chunk
+        between ``ind_start`` and ``ind_end``.
+        """
+        data = np.memmap(self.filename, dtype=self.dtype, mode='r+',
+                         offset=self.offset, shape=self.shape)
+        if self.axis == 0:
+            return data[ind_start:ind_end, :, :]
+        elif self.axis == 1:
+            return data[:, ind_start:ind_end, :]
+        elif self.axis == 2:
+            return data[:, :, ind_start:ind_end]
 
 # --------------------------------------------------------------------
 
@@ -38,19 +151,39 @@ class Multiprocess(object):
         self.total_jobs += 1
         self.jobs.put(job)
 
-    def close_out(self):
+    def close_out(self, callback=None, timeout=None):
+        """
+        Wait for all jobs and collect their results.
+        
+        Parameters
+        ----------
+        callback : callable, optional
+            Called with each result as soon as it arrives.
+            If given, results are not kept and an empty
+            list is returned.
+        
+        timeout : scalar, optional
+            Maximum number of seconds to wait for the next
+            result. Workers are terminated and a RuntimeError
+            is raised when it expires.
+        """
         # Add Poison Pills
         for i in range(self.num_cores):
             self.jobs.put((None,))
 
-        completed_jobs = 0
         res_list = []
-        while True:
-            if not self.results.empty():
-                res_list.append(self.results.get())
-                completed_jobs += 1
-            if completed_jobs==self.total_jobs:
-                break
+        for m in range(self.total_jobs):
+            try:
+                res = self.results.get(timeout=timeout)
+            except Empty:
+                for process in self.p:
+                    process.terminate()
+                raise RuntimeError("no job finished within " + 
+                                   str(timeout) + " seconds")
+            if callback is None:
+                res_list.append(res)
+            else:
+                callback(res)
         
         self.jobs.join()
         self.jobs.close()
@@ -63,6 +196,202 @@ class Multiprocess(object):
 
 # --------------------------------------------------------------------
 
+class WorkerPool(object):
+    def __init__(self, num_cores=None):
+        """
+        Pool of long-lived worker processes that can run
+        jobs of any function, so that consecutive calls to
+        ``distribute_jobs`` do not fork and join processes
+        every time.
+    
+        Call sequence:
+        1) Instantiate a pool object and call its start method
+           (or use it in a ``with`` statement).
+        2) Pass it to ``distribute_jobs`` as many times as needed.
+        3) Call its shutdown method.
+        """
+        if num_cores is None:
+            num_cores = mp.cpu_count()
+        self.num_cores = num_cores
+        self.p = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    @property
+    def running(self):
+        return len(self.p) > 0
+
+    def start(self):
+        if self.running:
+            return
+        self.jobs = mp.Queue()
+        self.results = mp.Queue()
+        tup = (self.jobs, self.results)
+        self.p = [mp.Process(target=_pool_worker, 
+                             args=tup) for i in range(self.num_cores)]
+        for process in self.p:
+            process.daemon = True
+            process.start()
+
+    def shutdown(self):
+        if not self.running:
+            return
+        # Add Poison Pills
+        for i in range(self.num_cores):
+            self.jobs.put(None)
+        for process in self.p:
+            process.join()
+        self.jobs.close()
+        self.results.close()
+        self.p = []
+
+    def run(self, func, jobs, callback=None, timeout=None):
+        """
+        Run ``func`` on every job and return the list
+        of results in order of completion. ``callback``
+        and ``timeout`` behave as in ``Multiprocess.close_out``.
+        """
+        if not self.running:
+            raise RuntimeError("worker pool is not started")
+        for job in jobs:
+            self.jobs.put((func, job))
+        res_list = []
+        error = None
+        for m in range(len(jobs)):
+            try:
+                res = self.results.get(timeout=timeout)
+            except Empty:
+                # Stuck workers can not be reused.
+                for process in self.p:
+                    process.terminate()
+                self.p = []
+                raise RuntimeError("no job finished within " + 
+                                   str(timeout) + " seconds")
+            # After a failure, keep collecting the other results
+            # so that none are left over for the next run.
+            if error is not None:
+                continue
+            try:
+                if isinstance(res, JobError):
+                    raise RuntimeError("job failed in worker:\n" + 
+                                       res.message)
+                if callback is None:
+                    res_list.append(res)
+                else:
+                    callback(res)
+            except Exception:
+                error = sys.exc_info()
+        if error is not None:
+            raise error[0], error[1], error[2]
+        return res_list
+
+# --------------------------------------------------------------------
+
+class JobError(object):
+    def __init__(self, message):
+        """
+        Traceback of a job that failed inside a pool worker.
+        """
+        self.message = message
+
+# --------------------------------------------------------------------
+
+def _pool_worker(jobs, results):
+    """
+    Main loop of a ``WorkerPool`` process.
+    """
+    while True:
+        item = jobs.get()
+        if item is None: # Deal with Poison Pill
+            break
+        func, job_args = item
+        try:
+            res = run_job(func, job_args)
+        except Exception:
+            res = JobError(traceback.format_exc())
+        results.put(res)
+
+# --------------------------------------------------------------------
+
+def run_job(func, job_args):
+    """
+    Run a single job in a worker. Jobs referring to a
+    shared array are mapped and written back in place,
+    or into the shared output array given as a fifth
+    element of the job.
+    """
+    if isinstance(job_args[0], SharedHandle):
+        chunk = job_args[0].view(job_args[2], job_args[3])
+        out = None
+        if len(job_args) > 4:
+            out = job_args[4].view(job_args[2], job_args[3])
+        return run_in_place(func, chunk, job_args, job_args[0].axis, out)
+    return func(job_args)
+
+# --------------------------------------------------------------------
+
+def run_in_place(func, chunk, job_args, axis, out=None):
+    """
+    Run a job on ``chunk``, a view of the data, and
+    write its result back into that view, or into
+    ``out`` if given.
+    """
+    if out is None:
+        out = chunk
+    if axis == 0:
+        work = chunk
+    else:
+        # Slabs along axis 1 and 2 are strided views;
+        # process them in a contiguous copy.
+        work = np.ascontiguousarray(chunk)
+    res = func((work,) + tuple(job_args[1:4]))
+    if res[2] is not out:
+        out[:] = res[2]
+    return res[0], res[1], None
+
+# --------------------------------------------------------------------
+
+def run_threads(func, jobs, axis, num_threads, callback):
+    """
+    Run jobs holding views of the data on a group of
+    threads. Suitable for functions that spend their
+    time in code releasing the GIL (NumPy, FFTW, etc.).
+    """
+    queue = Queue()
+    for job in jobs:
+        queue.put(job)
+    lock = threading.Lock()
+    errors = []
+
+    def _thread():
+        while not errors:
+            try:
+                job = queue.get_nowait()
+            except Empty:
+                break
+            try:
+                res = run_in_place(func, job[0], job, axis, *job[4:])
+            except Exception:
+                errors.append(traceback.format_exc())
+                break
+            with lock:
+                callback(res)
+
+    threads = [threading.Thread(target=_thread) for i in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise RuntimeError("job failed in thread:\n" + errors[0])
+
+# --------------------------------------------------------------------
+
 def worker(func):
     """
     Decorator for multiprocessing tasks.
@@ -77,7 +406,7 @@ def worker(func):
                 #print '{}: Exiting. {:d} jobs completed.'.format(name, jobs_completed)
                 jobs.task_done()
                 break
-            res = func(job_args)
+            res = run_job(func, job_args)
             jobs_completed += 1
             jobs.task_done()
             results.put(res)
@@ -86,8 +415,76 @@ def worker(func):
 
 # --------------------------------------------------------------------
 
+class ChainedJob(object):
+    def __init__(self, funcs):
+        """
+        Job function that runs several job functions one
+        after another on the same chunk, so that a chain of
+        steps along the same axis needs a single pass over
+        the data.
+
+        The job arguments must hold one argument tuple per
+        function, in the same order as ``funcs``.
+        """
+        self.funcs = list(funcs)
+
+    def __call__(self, job_args):
+        data, args, ind_start, ind_end = job_args
+        for func, func_args in zip(self.funcs, args):
+            ind_start, ind_end, data = func((data, func_args,
+                                             ind_start, ind_end))
+        return ind_start, ind_end, data
+
+# --------------------------------------------------------------------
+
+def _chunk(data, axis, ind_start, ind_end):
+    """
+    View of data from ``ind_start`` to ``ind_end`` along ``axis``.
+    """
+    index = [slice(None)] * data.ndim
+    index[axis] = slice(ind_start, ind_end)
+    return data[tuple(index)]
+
+# --------------------------------------------------------------------
+
+def auto_chunk_size(shape, itemsize, axis, num_cores):
+    """
+    Chunk size that queues about ``JOBS_PER_CORE`` work
+    units per core while keeping each unit below
+    ``CHUNK_BYTES``.
+    
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the data.
+    
+    itemsize : scalar
+        Number of bytes per element.
+    
+    axis : scalar
+        The dimension the jobs are distributed along.
+        
+    num_cores : scalar
+        Number of processors.
+    
+    Returns
+    -------
+    out : scalar
+        Number of indices along ``axis`` per job.
+    """
+    dims = shape[axis]
+    bytes_per_index = itemsize * int(np.prod(shape)) / max(dims, 1)
+    chunk_size = int(np.ceil(dims / float(num_cores * JOBS_PER_CORE)))
+    max_size = CHUNK_BYTES / max(bytes_per_index, 1)
+    return int(max(1, min(chunk_size, max_size)))
+
+# --------------------------------------------------------------------
+
 def distribute_jobs(data, func, args, axis, 
-                    num_cores=None, chunk_size=None):
+                    num_cores=None, chunk_size=None,
+                    shared=False, pool=None,
+                    timeout=None, progress=None,
+                    backend='process', out=None):
     """
     Distribute 3-D volume jobs in chunks into cores.
     
@@ -117,16 +514,63 @@ def distribute_jobs(data, func, args, axis,
         Number of packet size for each processor. 
         For example, if axis=0, and chunk_size=8, each processor
         gets 8 projections.if axis=1, and chunk_size=8, each processor
-        gets 8 slices, etc. If unspecified, the whole data
-        will be distributed to processors in equal chunks such that
-        each processor will get a single job to do.
+        gets 8 slices, etc. If unspecified, it is chosen by
+        ``auto_chunk_size``: each processor gets several smaller
+        jobs, and idle processors pull the next job from the
+        queue, so a single slow chunk does not stall the others.
+        
+    shared : bool, optional
+        If ``True`` data is placed in a shared memory-mapped
+        buffer (unless it already is one) and workers receive
+        only the chunk indices and a handle to that buffer.
+        Results are written in place, so no data is pickled
+        between processes.
+        
+    pool : WorkerPool, optional
+        Started worker pool to run the jobs on. If given,
+        no processes are created and ``num_cores`` is
+        ignored.
+        
+    timeout : scalar, optional
+        Maximum number of seconds to wait for any single
+        job to finish before giving up with a RuntimeError.
+        
+    progress : callable, optional
+        Called as ``progress(completed_jobs, total_jobs)``
+        every time a chunk has been written to the output.
+        
+    backend : str {'process', 'thread', 'serial'}, optional
+        How jobs are executed. ``'process'`` sends chunks to
+        worker processes. ``'thread'`` runs the function on
+        views of data in ``num_cores`` threads without any
+        pickling, which is preferable when the function
+        releases the GIL. ``'serial'`` runs all chunks in the
+        calling thread. ``shared``, ``pool`` and ``timeout``
+        only apply to the process backend.
+        
+    out : ndarray, optional
+        Array the results are written to, for example
+        a float32 array when data holds raw integers. It
+        must match data along ``axis``; the other
+        dimensions may differ if ``func`` changes them.
+        Data may still be used as scratch space by
+        ``func``. If unspecified data is overwritten.
         
     Returns
     -------
     out : ndarray
-        3-D output data after transformation.
+        3-D output data after transformation. If ``shared``
+        is ``True`` this is the shared array.
     """
+    if backend not in ('process', 'thread', 'serial'):
+        raise ValueError("unknown backend: " + str(backend))
+    if backend != 'process':
+        shared = False
+        pool = None
+    
     # Arrange number of processors.
+    if pool is not None:
+        num_cores = pool.num_cores
     if num_cores is None:
         num_cores = mp.cpu_count()
     dims = data.shape[axis]
@@ -137,15 +581,24 @@ def distribute_jobs(data, func, args, axis,
     
     # Arrange chunk size.
     if chunk_size is None:
-        chunk_size = dims / num_cores
+        chunk_size = auto_chunk_size(data.shape, data.dtype.itemsize,
+                                     axis, num_cores)
     
     # Determine pool size.
     pool_size = dims / chunk_size + 1
     
-    # Create multi-processing object.
-    multip = Multiprocess(worker(func), num_cores=num_cores)
-                          
+    # Move data to shared memory.
+    if shared:
+        data = as_shared(data)
+        handle = SharedHandle(data, axis)
+        if out is not None:
+            out = as_shared(out)
+            out_handle = SharedHandle(out, axis)
+    if out is None:
+        out = data
+    
     # Populate jobs.
+    jobs = []
     for m in range(pool_size):
         ind_start = m*chunk_size
         ind_end = (m+1)*chunk_size
@@ -160,23 +613,50 @@ def distribute_jobs(data, func, args, axis,
         if not isinstance(ind_end, np.int32):
             ind_end = np.array(ind_end, dtype=np.int32, copy=False)
         
-        # Add to queue.
-        if axis == 0:
-            multip.add_job((data[ind_start:ind_end, :, :], args, ind_start, ind_end))
+        if shared and out is data:
+            jobs.append((handle, args, ind_start, ind_end))
+        elif shared:
+            jobs.append((handle, args, ind_start, ind_end, out_handle))
+        elif backend != 'process' and out is not data:
+            jobs.append((_chunk(data, axis, ind_start, ind_end), args,
+                         ind_start, ind_end,
+                         _chunk(out, axis, ind_start, ind_end)))
+        elif axis == 0:
+            jobs.append((data[ind_start:ind_end, :, :], args, ind_start, ind_end))
         elif axis == 1:
-            multip.add_job((data[:, ind_start:ind_end, :], args, ind_start, ind_end))
+            jobs.append((data[:, ind_start:ind_end, :], args, ind_start, ind_end))
         elif axis == 2:
-            multip.add_job((data[:, :, ind_start:ind_end], args, ind_start, ind_end))
+            jobs.append((data[:, :, ind_start:ind_end], args, ind_start, ind_end))
 
-    # Collect results.
-    for each in multip.close_out():
-        if axis == 0:
-            data[each[0]:each[1], :, :] = each[2]
-        elif axis == 1:
-            data[:, each[0]:each[1], :] = each[2]
-        elif axis == 2:
-            data[:, :, each[0]:each[1]] = each[2]
-    return data
+    # Collect results as they arrive.
+    completed = [0]
+    def _collect(each):
+        if each[2] is not None: # Otherwise already written in place.
+            if axis == 0:
+                out[each[0]:each[1], :, :] = each[2]
+            elif axis == 1:
+                out[:, each[0]:each[1], :] = each[2]
+            elif axis == 2:
+                out[:, :, each[0]:each[1]] = each[2]
+        completed[0] += 1
+        if progress is not None:
+            progress(completed[0], len(jobs))
+
+    # Run the jobs.
+    if backend == 'serial':
+        for job in jobs:
+            _collect(run_in_place(func, job[0], job, axis, *job[4:]))
+    elif backend == 'thread':
+        run_threads(func, jobs, axis, num_cores, _collect)
+    elif pool is not None:
+        pool.run(func, jobs, callback=_collect, timeout=timeout)
+    else:
+        # Create multi-processing object.
+        multip = Multiprocess(worker(func), num_cores=num_cores)
+        for job in jobs:
+            multip.add_job(job)
+        multip.close_out(callback=_collect, timeout=timeout)
+    return out
 
 
 
@@ -2,11 +2,16 @@
 import numpy as np
 import logging
 
+from syncpy.tomopy.tools.multiprocess import as_shared, distribute_jobs
+from syncpy.tomopy.tools.multiprocess import ChainedJob, WorkerPool, shared_array
+
 
 class XTomoDataset:
     def __init__(xtomo, data, data_white=None, 
                  data_dark=None, theta=None, 
-                 log='INFO', color_log=True):
+                 log='INFO', color_log=True,
+                 shared_memory=False, backend=None, lazy=False,
+                 keep_raw=False):
         """
         Constructor for the X-ray absorption 
         tomography data object.
@@ -41,6 +46,37 @@ class XTomoDataset:
             If ``True`` command line logging is colored. 
             You may want to set it ``False`` if you will use 
             file logging only.
+            
+        shared_memory : bool, optional
+            If ``True`` the data is kept in a shared memory-mapped
+            buffer and the parallel methods hand workers only
+            chunk indices instead of pickled copies of the data.
+            
+        backend : str {'process', 'thread', 'serial'}, optional
+            Execution backend used by all parallel methods.
+            If unspecified each method uses the backend
+            that suits its algorithm best.
+            
+        lazy : bool, optional
+            If ``True`` the per-projection and per-slice methods
+            (``normalize``, ``zinger_removal``, ``phase_retrieval``,
+            ``median_filter``, ``stripe_removal``) are only
+            recorded. They are run by ``compute``, which fuses
+            consecutive steps along the same axis into a single
+            pass over each chunk. Methods that need the processed
+            data call ``compute`` themselves. Padding values of
+            ``phase_retrieval`` taken from the data ('mean' or
+            'sample') are then found per chunk.
+            
+        keep_raw : bool, optional
+            If ``True`` data is kept as given (e.g. a uint16
+            array or an ``np.memmap``) instead of being copied
+            to float32. It is converted chunk by chunk by the
+            first preprocessing method called, which writes to
+            a new float32 array, so ``zinger_removal`` can still
+            work on raw counts before ``normalize``. The white
+            field, if not given, is then estimated from a subset
+            of projections.
         """      
         # Logging init.
         if color_log: # enable colored logging
@@ -52,7 +88,20 @@ class XTomoDataset:
         xtomo._init_logging()
  
         # Set the numpy Data-Exchange structure.
-        xtomo.data = np.array(data, dtype='float32', copy=False)
+        xtomo.pool = None
+        xtomo.backend = backend
+        xtomo.shared_memory = shared_memory
+        xtomo.lazy = lazy
+        xtomo._pipeline = []
+        xtomo.minus_log = False
+        if keep_raw and shared_memory:
+            xtomo.data = as_shared(np.asarray(data))
+        elif keep_raw:
+            xtomo.data = np.asarray(data)
+        elif shared_memory:
+            xtomo.data = as_shared(data, dtype='float32')
+        else:
+            xtomo.data = np.array(data, dtype='float32', copy=False)
         xtomo.data_white = np.array(data_white, dtype='float32', copy=False)
         xtomo.data_dark = np.array(data_dark, dtype='float32', copy=False)
         xtomo.theta = np.array(np.squeeze(theta), dtype='float32', copy=False)
@@ -65,7 +114,11 @@ class XTomoDataset:
         # Assign data_white
         if data_white is None:
             xtomo.data_white = np.zeros((1, num_slices, num_pixels))
-            xtomo.data_white += np.mean(xtomo.data[:])
+            if keep_raw: # Sample some projections only.
+                step = max(1, num_projs // 16)
+                xtomo.data_white += np.mean(xtomo.data[::step])
+            else:
+                xtomo.data_white += np.mean(xtomo.data[:])
             xtomo.logger.warning("auto-normalization [ok]")
             
         # Assign data_dark
@@ -78,6 +131,127 @@ class XTomoDataset:
             xtomo.theta = np.linspace(0, num_projs, num_projs)*180/(num_projs+1)
             xtomo.logger.warning("assign 180-degree rotation [ok]")
 
+    def start_pool(xtomo, num_cores=None):
+        """
+        Start a pool of worker processes that is reused by
+        all parallel methods until ``shutdown_pool`` is called.
+        
+        Parameters
+        ----------
+        num_cores : scalar, optional
+            Number of worker processes. If unspecified
+            maximum amount of processors will be used.
+        """
+        if xtomo.pool is not None:
+            xtomo.shutdown_pool()
+        xtomo.pool = WorkerPool(num_cores)
+        xtomo.pool.start()
+        xtomo.logger.debug("start_pool: num_cores: " + str(xtomo.pool.num_cores))
+        xtomo.logger.info("start_pool [ok]")
+
+    def shutdown_pool(xtomo):
+        """
+        Stop the worker pool started by ``start_pool``.
+        """
+        if xtomo.pool is None:
+            return
+        xtomo.pool.shutdown()
+        xtomo.pool = None
+        xtomo.logger.info("shutdown_pool [ok]")
+
+    def _defer(xtomo, func, args, axis, backend,
+               num_cores=None, chunk_size=None):
+        """
+        Record a job function to be run on the data
+        by ``compute``.
+        """
+        xtomo._pipeline.append((func, args, axis, backend,
+                                num_cores, chunk_size))
+        xtomo.logger.debug("lazy: deferred " + func.__name__)
+
+    def _float_out(xtomo):
+        """
+        Output buffer for methods that convert raw data,
+        or ``None`` if data is already float32.
+        """
+        if xtomo.data.dtype == np.float32:
+            return None
+        return xtomo._empty_out(xtomo.data.shape)
+
+    def _empty_out(xtomo, shape):
+        """
+        Uninitialized float32 output buffer of the given
+        shape, in shared memory if data is shared.
+        """
+        if xtomo.shared_memory:
+            return shared_array(shape, dtype='float32')
+        return np.empty(shape, dtype='float32')
+
+    def compute(xtomo, num_cores=None, chunk_size=None):
+        """
+        Run the methods recorded in lazy mode.
+        
+        Consecutive steps along the same axis are fused and
+        run chunk by chunk in a single call to
+        ``distribute_jobs``, so no intermediate volume is
+        created between them.
+        
+        Parameters
+        ----------
+        num_cores : scalar, optional
+            Number of processors. Overrides the values
+            given to the recorded methods.
+            
+        chunk_size : scalar, optional
+            Chunk size. Overrides the values given to the
+            recorded methods.
+        """
+        if not len(xtomo._pipeline):
+            return
+        pipeline, xtomo._pipeline = xtomo._pipeline, []
+        while len(pipeline):
+            # Take the longest run of steps along one axis.
+            axis = pipeline[0][2]
+            num_steps = 1
+            while (num_steps < len(pipeline) and 
+                   pipeline[num_steps][2] == axis):
+                num_steps += 1
+            group, pipeline = pipeline[:num_steps], pipeline[num_steps:]
+            
+            if len(group) == 1:
+                _func = group[0][0]
+                _args = group[0][1]
+            else:
+                _func = ChainedJob([step[0] for step in group])
+                _args = tuple([step[1] for step in group])
+                
+            # Processes are needed as soon as one step holds the GIL.
+            _backend = 'thread'
+            for step in group:
+                if step[3] != 'thread':
+                    _backend = step[3]
+            
+            # Explicit arguments win over the recorded ones.
+            _num_cores, _chunk_size = num_cores, chunk_size
+            for step in group:
+                if _num_cores is None:
+                    _num_cores = step[4]
+                if _chunk_size is None:
+                    _chunk_size = step[5]
+                    
+            # Raw data is converted to float32 by the first pass.
+            xtomo.data = distribute_jobs(xtomo.data, _func, _args, axis,
+                                         _num_cores, _chunk_size,
+                                         shared=xtomo.shared_memory,
+                                         pool=xtomo.pool,
+                                         backend=xtomo.backend or _backend,
+                                         out=xtomo._float_out())
+            
+            xtomo.logger.debug("compute: fused " + 
+                               ", ".join([step[0].__name__ for step in group]) + 
+                               " along axis " + str(axis))
+        xtomo.logger.info("compute [ok]")
+
     def _init_logging(xtomo):
         """
         Setup and start command line logging.
@@ -32,8 +32,11 @@ def adaptive_segment(xtomo, block_size=256, offset=0,
     _func = _adaptive_segment
     _args = (block_size, offset)
     _axis = 0 # Slice axis
+    _backend = 'process' # scikit-image holds the GIL
     data_recon = distribute_jobs(data, _func, _args, _axis, 
-                                 num_cores, chunk_size)
+                                 num_cores, chunk_size,
+                                 shared=xtomo.shared_memory, pool=xtomo.pool,
+                                 backend=xtomo.backend or _backend)
                                          
     # Update log.
     xtomo.logger.debug("adaptive_segment: block_size: " + str(block_size))
@@ -58,8 +61,11 @@ def region_segment(xtomo, low=None, high=None,
     _func = _region_segment
     _args = (low, high)
     _axis = 0 # Slice axis
+    _backend = 'process' # scikit-image holds the GIL
     data_recon = distribute_jobs(data, _func, _args, _axis, 
-                                 num_cores, chunk_size)
+                                 num_cores, chunk_size,
+                                 shared=xtomo.shared_memory, pool=xtomo.pool,
+                                 backend=xtomo.backend or _backend)
 
     # Update provenance.
     xtomo.logger.debug("region_segment: low: " + str(low))
@@ -80,8 +86,11 @@ def remove_background(xtomo,
     _func = _remove_background
     _args = ()
     _axis = 0 # Slice axis
+    _backend = 'process' # scikit-image holds the GIL
     data_recon = distribute_jobs(xtomo.data_recon, _func, _args, _axis, 
-                                 num_cores, chunk_size)
+                                 num_cores, chunk_size,
+                                 shared=xtomo.shared_memory, pool=xtomo.pool,
+                                 backend=xtomo.backend or _backend)
                                          
     # Update provenance.
     xtomo.logger.info("remove_background [ok]")
@@ -104,8 +113,11 @@ def threshold_segment(xtomo, cutoff=None,
     _func = _threshold_segment
     _args = ()
     _axis = 0 # Slice axis
+    _backend = 'process' # scikit-image holds the GIL
     data_recon = distribute_jobs(data, _func, _args, _axis, 
-                                 num_cores, chunk_size)
+                                 num_cores, chunk_size,
+                                 shared=xtomo.shared_memory, pool=xtomo.pool,
+                                 backend=xtomo.backend or _backend)
                                                       
     # Update provenance.
     xtomo.logger.debug("threshold_segment: cutoff: " + str(cutoff))
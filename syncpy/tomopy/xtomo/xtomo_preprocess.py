@@ -15,10 +15,10 @@ from syncpy.tomopy.algorithms.preprocess.apply_padding import _apply_padding
 from syncpy.tomopy.algorithms.preprocess.correct_drift import _correct_drift
 from syncpy.tomopy.algorithms.preprocess.downsample import _downsample2d, _downsample3d
 from syncpy.tomopy.algorithms.preprocess.median_filter import _median_filter
-from syncpy.tomopy.algorithms.preprocess.normalize import _normalize
+from syncpy.tomopy.algorithms.preprocess.normalize import _normalize, _normalize_dynamic, _flat_interpolation
 from syncpy.tomopy.algorithms.preprocess.phase_retrieval import _phase_retrieval, _paganin_filter
-from syncpy.tomopy.algorithms.preprocess.stripe_removal import _stripe_removal
-from syncpy.tomopy.algorithms.preprocess.zinger_removal import _zinger_removal
+from syncpy.tomopy.algorithms.preprocess.stripe_removal import _stripe_removal, _stripe_removal_sort
+from syncpy.tomopy.algorithms.preprocess.zinger_removal import _zinger_removal, _zinger_removal_temporal
 
 # Import multiprocessing module.
 from syncpy.tomopy.tools.multiprocess import distribute_jobs
@@ -28,7 +28,10 @@ from syncpy.tomopy.tools.multiprocess import distribute_jobs
 
 def apply_padding(xtomo, num_pad=None,
                   num_cores=None, chunk_size=None,
-                  overwrite=True):
+                  overwrite=True, out=None):
+
+    # Run deferred steps first.
+    xtomo.compute()
 
     # Set default parameters.
     num_pixels = xtomo.data.shape[2]
@@ -39,7 +42,21 @@ def apply_padding(xtomo, num_pad=None,
     if not isinstance(num_pad, np.int32):
         num_pad = np.array(num_pad, dtype='int32')
 
-    data = _apply_padding(xtomo.data, num_pad)
+    # Padded output, filled chunk by chunk.
+    if out is None:
+        out = xtomo._empty_out(xtomo.data.shape[:2] + (int(num_pad),))
+
+    # Set default parameters.
+    _func = _apply_padding
+    _args = (num_pad)
+    _axis = 0 # Projection axis
+    _backend = 'thread' # ctypes releases the GIL
+    
+    data = distribute_jobs(xtomo.data, _func, _args, _axis, 
+                           num_cores, chunk_size,
+                           shared=xtomo.shared_memory, pool=xtomo.pool,
+                           backend=xtomo.backend or _backend,
+                           out=out)
     
     # Update log.
     xtomo.logger.debug("apply_padding: num_pad: " + str(num_pad))
@@ -54,12 +71,25 @@ def apply_padding(xtomo, num_pad=None,
 def correct_drift(xtomo, air_pixels=20, 
                   num_cores=None, chunk_size=None,
                   overwrite=True):
+
+    # Run deferred steps first.
+    xtomo.compute()
     
     # Check input.
     if not isinstance(air_pixels, np.int32):
         air_pixels = np.array(air_pixels, dtype='int32')
     
-    data = _correct_drift(xtomo.data, air_pixels)
+    # Set default parameters.
+    _func = _correct_drift
+    _args = (air_pixels)
+    _axis = 0 # Projection axis
+    _backend = 'thread' # ctypes releases the GIL
+    
+    data = distribute_jobs(xtomo.data, _func, _args, _axis, 
+                           num_cores, chunk_size,
+                           shared=xtomo.shared_memory, pool=xtomo.pool,
+                           backend=xtomo.backend or _backend,
+                           out=xtomo._float_out())
    
     # Update log.
     xtomo.logger.debug("correct_drift: air_pixels: " + str(air_pixels))
@@ -73,13 +103,32 @@ def correct_drift(xtomo, air_pixels=20,
 
 def downsample2d(xtomo, level=1,
                  num_cores=None, chunk_size=None,
-                 overwrite=True):
+                 overwrite=True, out=None):
+
+    # Run deferred steps first.
+    xtomo.compute()
     
     # Check input.
     if not isinstance(level, np.int32):
         level = np.array(level, dtype='int32')
 
-    data = _downsample2d(xtomo.data, level)
+    # Downsampled output, filled chunk by chunk.
+    if out is None:
+        num_projections, num_slices, num_pixels = xtomo.data.shape
+        out = xtomo._empty_out((num_projections, num_slices,
+                                num_pixels / np.power(2, int(level))))
+
+    # Set default parameters.
+    _func = _downsample2d
+    _args = (level)
+    _axis = 0 # Projection axis
+    _backend = 'thread' # ctypes releases the GIL
+    
+    data = distribute_jobs(xtomo.data, _func, _args, _axis, 
+                           num_cores, chunk_size,
+                           shared=xtomo.shared_memory, pool=xtomo.pool,
+                           backend=xtomo.backend or _backend,
+                           out=out)
     
     # Update log.
     xtomo.logger.debug("downsample2d: level: " + str(level))
@@ -93,13 +142,33 @@ def downsample2d(xtomo, level=1,
 
 def downsample3d(xtomo, level=1,
                  num_cores=None, chunk_size=None,
-                 overwrite=True):
+                 overwrite=True, out=None):
+
+    # Run deferred steps first.
+    xtomo.compute()
 
     # Check input.
     if not isinstance(level, np.int32):
         level = np.array(level, dtype='int32')
 
-    data = _downsample3d(xtomo.data, level)
+    # Downsampled output, filled chunk by chunk.
+    if out is None:
+        num_projections, num_slices, num_pixels = xtomo.data.shape
+        binsize = np.power(2, int(level))
+        out = xtomo._empty_out((num_projections, num_slices / binsize,
+                                num_pixels / binsize))
+
+    # Set default parameters.
+    _func = _downsample3d
+    _args = (level)
+    _axis = 0 # Projection axis
+    _backend = 'thread' # ctypes releases the GIL
+    
+    data = distribute_jobs(xtomo.data, _func, _args, _axis, 
+                           num_cores, chunk_size,
+                           shared=xtomo.shared_memory, pool=xtomo.pool,
+                           backend=xtomo.backend or _backend,
+                           out=out)
     
     # Update log.
     xtomo.logger.debug("downsample3d: level: " + str(level))
@@ -119,8 +188,17 @@ def median_filter(xtomo, size=5,
     _func = _median_filter
     _args = (size)
     _axis = 1 # Slice axis
-    data = distribute_jobs(xtomo.data, _func, _args, _axis, 
-                           num_cores, chunk_size)
+    _backend = 'thread' # ctypes releases the GIL
+    if xtomo.lazy and overwrite:
+        xtomo._defer(_func, _args, _axis, _backend, num_cores, chunk_size)
+        data = xtomo.data
+    else:
+        xtomo.compute()
+        data = distribute_jobs(xtomo.data, _func, _args, _axis, 
+                               num_cores, chunk_size,
+                               shared=xtomo.shared_memory, pool=xtomo.pool,
+                               backend=xtomo.backend or _backend,
+                               out=xtomo._float_out())
    
     # Update log.
     xtomo.logger.debug("median_filter: size: " + str(size))
@@ -132,46 +210,94 @@ def median_filter(xtomo, size=5,
 
 # --------------------------------------------------------------------
 
-def normalize(xtomo, cutoff=None, 
+def normalize(xtomo, cutoff=None, minus_log=False,
+              white_index=None, proj_index=None,
               num_cores=None, chunk_size=None,
               overwrite=True):
 
-    # Calculate average white and dark fields for normalization.
-    avg_white = np.mean(xtomo.data_white, axis=0)
+    # Calculate average dark field for normalization.
     avg_dark = np.mean(xtomo.data_dark, axis=0)
+    avg_dark = np.array(avg_dark, dtype='float32')
+    
+    if white_index is None:
+        # The flat field is inverted once for all projections.
+        avg_white = np.mean(xtomo.data_white, axis=0)
+        flat_scale = np.array(1. / (avg_white - avg_dark), dtype='float32')
+        _func = _normalize
+        _args = (avg_dark, flat_scale, cutoff, minus_log)
+    else:
+        # Flat fields are interpolated for each projection.
+        if proj_index is None:
+            proj_index = np.arange(xtomo.data.shape[0])
+        flats, lower, upper, weight = _flat_interpolation(
+                xtomo.data_white, avg_dark, white_index, proj_index)
+        _func = _normalize_dynamic
+        _args = (avg_dark, flats, lower, upper, weight, cutoff, minus_log)
     
     # Distribute jobs.
-    _func = _normalize
-    _args = (avg_white, avg_dark, cutoff)
     _axis = 0 # Projection axis
-    data = distribute_jobs(xtomo.data, _func, _args, _axis, 
-			   num_cores, chunk_size)
+    _backend = 'thread' # NumPy releases the GIL
+    if xtomo.lazy and overwrite:
+        xtomo._defer(_func, _args, _axis, _backend, num_cores, chunk_size)
+        data = xtomo.data
+    else:
+        xtomo.compute()
+        data = distribute_jobs(xtomo.data, _func, _args, _axis, 
+                               num_cores, chunk_size,
+                               shared=xtomo.shared_memory, pool=xtomo.pool,
+                               backend=xtomo.backend or _backend,
+                               out=xtomo._float_out())
 
     # Update log.
     xtomo.logger.debug("normalize: cutoff: " + str(cutoff))
+    xtomo.logger.debug("normalize: minus_log: " + str(minus_log))
+    xtomo.logger.debug("normalize: white_index: " + str(white_index))
     xtomo.logger.info("normalize [ok]")
     
     # Update returned values.
-    if overwrite: xtomo.data = data
+    if overwrite: 
+        xtomo.data = data
+        xtomo.minus_log = minus_log
     else: return data	
 
 # --------------------------------------------------------------------
 
 def phase_retrieval(xtomo, pixel_size=None, dist=None, 
                     energy=None, alpha=1e-5, padding=True,
+                    pad_value='mean', cache_dir=None,
                     num_cores=None, chunk_size=None,
                     overwrite=True):        
         
+    # Padding values are taken from the data unless given:
+    # from each chunk if deferred, else from all projections.
+    lazy = xtomo.lazy and overwrite
+    chunk_pad = None
+    if padding and isinstance(pad_value, basestring):
+        if lazy:
+            chunk_pad, pad_value = pad_value, 0
+        else:
+            xtomo.compute()
+        
     # Compute the filter.
     H, x_shift, y_shift, tmp_proj = _paganin_filter(xtomo.data,
-                                    pixel_size, dist, energy, alpha, padding)                 
+                                    pixel_size, dist, energy, alpha, padding,
+                                    pad_value, cache_dir)                 
                      
     # Distribute jobs.
     _func = _phase_retrieval
-    _args = (H, x_shift, y_shift, tmp_proj, padding)
+    _args = (H, x_shift, y_shift, tmp_proj, padding, chunk_pad)
     _axis = 0 # Projection axis
-    data = distribute_jobs(xtomo.data, _func, _args, _axis, 
-                           num_cores, chunk_size)
+    _backend = 'thread' # batched FFTW plans are thread-safe
+    if lazy:
+        xtomo._defer(_func, _args, _axis, _backend, num_cores, chunk_size)
+        data = xtomo.data
+    else:
+        xtomo.compute()
+        data = distribute_jobs(xtomo.data, _func, _args, _axis, 
+                               num_cores, chunk_size,
+                               shared=xtomo.shared_memory, pool=xtomo.pool,
+                               backend=xtomo.backend or _backend,
+                               out=xtomo._float_out())
 
     # Update log.
     xtomo.logger.debug("phase_retrieval: pixel_size: " + str(pixel_size))
@@ -179,6 +305,7 @@ def phase_retrieval(xtomo, pixel_size=None, dist=None,
     xtomo.logger.debug("phase_retrieval: energy: " + str(energy))
     xtomo.logger.debug("phase_retrieval: alpha: " + str(alpha))
     xtomo.logger.debug("phase_retrieval: padding: " + str(padding))
+    xtomo.logger.debug("phase_retrieval: pad_value: " + str(chunk_pad or pad_value))
     xtomo.logger.info("phase_retrieval [ok]")
     
     # Update returned values.
@@ -188,6 +315,7 @@ def phase_retrieval(xtomo, pixel_size=None, dist=None,
 # --------------------------------------------------------------------
 
 def stripe_removal(xtomo, level=None, wname='db5', sigma=4,
+                   method='wavelet', filter_size=21,
                    num_cores=None, chunk_size=None,
                    overwrite=True):
 
@@ -197,16 +325,33 @@ def stripe_removal(xtomo, level=None, wname='db5', sigma=4,
         level = int(np.ceil(np.log2(size)))
         
     # Distribute jobs.
-    _func = _stripe_removal
-    _args = (level, wname, sigma)
+    if method == 'wavelet':
+        _func = _stripe_removal
+        _args = (level, wname, sigma)
+        _backend = 'process' # pywt holds the GIL
+    elif method == 'sort':
+        _func = _stripe_removal_sort
+        _args = (filter_size)
+        _backend = 'thread' # NumPy and ctypes release the GIL
+    else:
+        raise ValueError("unknown stripe_removal method: " + str(method))
     _axis = 1 # Slice axis
-    data = distribute_jobs(xtomo.data, _func, _args, _axis,
-                           num_cores, chunk_size)
+    if xtomo.lazy and overwrite:
+        xtomo._defer(_func, _args, _axis, _backend, num_cores, chunk_size)
+        data = xtomo.data
+    else:
+        xtomo.compute()
+        data = distribute_jobs(xtomo.data, _func, _args, _axis,
+                               num_cores, chunk_size,
+                               shared=xtomo.shared_memory, pool=xtomo.pool,
+                               backend=xtomo.backend or _backend,
+                               out=xtomo._float_out())
 			
     # Update log.
     xtomo.logger.debug("stripe_removal: level: " + str(level))
     xtomo.logger.debug("stripe_removal: wname: " + str(wname))
     xtomo.logger.debug("stripe_removal: sigma: " + str(sigma))
+    xtomo.logger.debug("stripe_removal: method: " + str(method))
     xtomo.logger.info("stripe_removal [ok]")
     
     # Update returned values.
@@ -216,25 +361,45 @@ def stripe_removal(xtomo, level=None, wname='db5', sigma=4,
 # --------------------------------------------------------------------
 
 def zinger_removal(xtomo, zinger_level=1000, median_width=3,
+                   method='spatial',
                    num_cores=None, chunk_size=None,
                    overwrite=True):
 
     # Distribute jobs.
-    _func = _zinger_removal
     _args = (zinger_level, median_width)
-    _axis = 0 # Projection axis
-    data = distribute_jobs(xtomo.data, _func, _args, _axis,
-                           num_cores, chunk_size)
-
-    data_white = distribute_jobs(xtomo.data_white, _func, _args, _axis,
-                           num_cores, chunk_size)
-    
-    data_dark = distribute_jobs(xtomo.data_dark, _func, _args, _axis,
-                           num_cores, chunk_size)
+    if method == 'spatial':
+        _func = _zinger_removal
+        _axis = 0 # Projection axis
+        _backend = 'thread' # ctypes releases the GIL
+    elif method == 'temporal':
+        _func = _zinger_removal_temporal
+        _axis = 1 # Slice axis, all projections needed
+        _backend = 'thread' # NumPy releases the GIL
+    else:
+        raise ValueError("unknown zinger_removal method: " + str(method))
+    if xtomo.lazy and overwrite:
+        xtomo._defer(_func, _args, _axis, _backend, num_cores, chunk_size)
+        data = xtomo.data
+    else:
+        xtomo.compute()
+        data = distribute_jobs(xtomo.data, _func, _args, _axis,
+                               num_cores, chunk_size,
+                               shared=xtomo.shared_memory, pool=xtomo.pool,
+                               backend=xtomo.backend or _backend,
+                               out=xtomo._float_out())
+
+    # White and dark fields are small; clean each of them
+    # as a single chunk instead of scheduling more jobs. They
+    # may hold a single shot, so they are filtered spatially.
+    num_white = xtomo.data_white.shape[0]
+    data_white = _zinger_removal((xtomo.data_white, _args, 0, num_white))[2]
+    num_dark = xtomo.data_dark.shape[0]
+    data_dark = _zinger_removal((xtomo.data_dark, _args, 0, num_dark))[2]
 
     # Update log.
     xtomo.logger.debug("zinger_removal: zinger_level: " + str(zinger_level))
     xtomo.logger.debug("zinger_removal: median_width: " + str(median_width))
+    xtomo.logger.debug("zinger_removal: method: " + str(method))
     xtomo.logger.info("zinger_removal [ok]")
 
     # Update returned values.
@@ -26,6 +26,9 @@ from syncpy.tomopy.algorithms.recon.upsample import _upsample2d, _upsample3d
 
 def diagnose_center(xtomo, dir_path=None, slice_no=None,
 		    center_start=None, center_end=None, center_step=None):
+
+    # Run deferred steps first.
+    xtomo.compute()
 	
     # Dimensions:
     num_slices = xtomo.data.shape[1]
@@ -49,9 +52,12 @@ def diagnose_center(xtomo, dir_path=None, slice_no=None,
     if center_step is None:
         center_step = 1
 
+    # Gridrec takes the minus log unless normalize did.
+    fluorescence = int(bool(xtomo.minus_log))
+
     # Call function.
     _diagnose_center(xtomo.data, xtomo.theta, dir_path, slice_no, 
-                     center_start, center_end, center_step)
+                     center_start, center_end, center_step, fluorescence)
 
     # Update log.
     xtomo.logger.debug("diagnose_center: dir_path: " + str(dir_path))
@@ -64,30 +70,34 @@ def diagnose_center(xtomo, dir_path=None, slice_no=None,
 # --------------------------------------------------------------------
 
 def optimize_center(xtomo, slice_no=None, center_init=None, 
-                    tol=0.5, overwrite=True):
+                    tol=0.5, overwrite=True, level=2, search=None):
+
+    # Run deferred steps first.
+    xtomo.compute()
                     
     # Dimensions:
     num_slices = xtomo.data.shape[1]
-    num_pixels = xtomo.data.shape[2]
 
     # Set default parameters.
     if slice_no is None:
         slice_no = num_slices/2
     
-    if center_init is None:
-        center_init = num_pixels/2
-                          
     # Make check.                      
-    if not isinstance(center_init, np.float32):
+    if center_init is not None and not isinstance(center_init, np.float32):
         center_init = np.array(center_init, dtype='float32')
 
+    # Gridrec takes the minus log unless normalize did.
+    fluorescence = int(bool(xtomo.minus_log))
+
     # All set, give me center now.
-    center = _optimize_center(xtomo.data, xtomo.theta, slice_no, center_init, tol)
+    center = _optimize_center(xtomo.data, xtomo.theta, slice_no, center_init, tol,
+                              level, search, fluorescence)
     
     # Update log.
     xtomo.logger.debug("optimize_center: slice_no: " + str(slice_no))
     xtomo.logger.debug("optimize_center: center_init: " + str(center_init))
     xtomo.logger.debug("optimize_center: tol: " + str(tol))
+    xtomo.logger.debug("optimize_center: level: " + str(level))
     xtomo.logger.info("optimize_center [ok]")
     
     # Update returned values.
@@ -136,7 +146,11 @@ def upsample3d(xtomo, level=1,
     
 # --------------------------------------------------------------------
     
-def art(xtomo, iters=1, num_grid=None, init_matrix=None, overwrite=True):
+def art(xtomo, iters=1, num_grid=None, init_matrix=None, overwrite=True,
+        num_pad=None, pad_edge=False):
+
+    # Run deferred steps first.
+    xtomo.compute()
     
     # Dimensions:
     num_pixels = xtomo.data.shape[2]
@@ -145,16 +159,24 @@ def art(xtomo, iters=1, num_grid=None, init_matrix=None, overwrite=True):
     if np.max(xtomo.theta) > 90: # then theta is obviously in radians.
         xtomo.theta *= np.pi/180
 
-    # Pad data first.
-    data = xtomo.apply_padding(overwrite=False)
-    data = -np.log(data);
+    # Padding is virtual, the projector only needs its width.
+    if num_pad is None:
+        num_pad = np.ceil(num_pixels * np.sqrt(2))
+    num_pad = int(num_pad)
+    
+    # Take the minus log unless normalize did.
+    if xtomo.minus_log:
+        data = xtomo.data
+    else:
+        data = np.log(xtomo.data)
+        np.negative(data, data)
     
     # Adjust center according to padding.
-    center = xtomo.center + (data.shape[2]-num_pixels)/2.
+    center = xtomo.center + (num_pad-num_pixels)/2.
 
     # Set default parameters.
     if num_grid is None or num_grid > num_pixels:
-        num_grid = np.floor(data.shape[2] / np.sqrt(2))
+        num_grid = np.floor(num_pad / np.sqrt(2))
         xtomo.logger.debug("art: num_grid set to " + str(num_grid) + " [ok]")
         
     if init_matrix is None:   
@@ -182,12 +204,14 @@ def art(xtomo, iters=1, num_grid=None, init_matrix=None, overwrite=True):
         init_matrix = np.array(init_matrix, dtype='float32', copy=False)
 
     # Initialize and perform reconstruction.
-    data_recon = _art(data, theta, center, num_grid, iters, init_matrix)
+    data_recon = _art(data, theta, center, num_grid, iters, init_matrix,
+                      num_pad, pad_edge)
     
     # Update log.
     xtomo.logger.debug("art: iters: " + str(iters))
     xtomo.logger.debug("art: center: " + str(center))
     xtomo.logger.debug("art: num_grid: " + str(num_grid))
+    xtomo.logger.debug("art: num_pad: " + str(num_pad))
     xtomo.logger.info("art [ok]")
     
     # Update returned values.
@@ -196,7 +220,11 @@ def art(xtomo, iters=1, num_grid=None, init_matrix=None, overwrite=True):
     
 # --------------------------------------------------------------------
     
-def mlem(xtomo, iters=1, num_grid=None, init_matrix=None, overwrite=True):
+def mlem(xtomo, iters=1, num_grid=None, init_matrix=None, overwrite=True,
+         num_pad=None, pad_edge=False):
+
+    # Run deferred steps first.
+    xtomo.compute()
 
     # Dimensions:
     num_pixels = xtomo.data.shape[2]
@@ -205,16 +233,24 @@ def mlem(xtomo, iters=1, num_grid=None, init_matrix=None, overwrite=True):
     if np.max(xtomo.theta) > 90: # then theta is obviously in radians.
         xtomo.theta *= np.pi/180
 
-    # Pad data first.
-    data = xtomo.apply_padding(overwrite=False)
-    data = np.abs(-np.log(data));
+    # Padding is virtual, the projector only needs its width.
+    if num_pad is None:
+        num_pad = np.ceil(num_pixels * np.sqrt(2))
+    num_pad = int(num_pad)
+    
+    # Take the log unless normalize did, mlem uses its
+    # absolute value.
+    if xtomo.minus_log:
+        data = xtomo.data
+    else:
+        data = np.log(xtomo.data)
 
     # Adjust center according to padding.
-    center = xtomo.center + (data.shape[2]-num_pixels)/2.
+    center = xtomo.center + (num_pad-num_pixels)/2.
    
     # Set default parameters.
     if num_grid is None or num_grid > num_pixels:
-        num_grid = np.floor(data.shape[2] / np.sqrt(2))
+        num_grid = np.floor(num_pad / np.sqrt(2))
         xtomo.logger.debug("mlem: num_grid set to " + str(num_grid) + " [ok]")
         
     if init_matrix is None:
@@ -242,12 +278,14 @@ def mlem(xtomo, iters=1, num_grid=None, init_matrix=None, overwrite=True):
         init_matrix = np.array(init_matrix, dtype='float32', copy=False)
 
     # Initialize and perform reconstruction.
-    data_recon = _mlem(data, theta, center, num_grid, iters, init_matrix)
+    data_recon = _mlem(data, theta, center, num_grid, iters, init_matrix,
+                       num_pad, pad_edge)
 
     # Update log.
     xtomo.logger.debug("mlem: iters: " + str(iters))
     xtomo.logger.debug("mlem: center: " + str(center))
     xtomo.logger.debug("mlem: num_grid: " + str(num_grid))
+    xtomo.logger.debug("mlem: num_pad: " + str(num_pad))
     xtomo.logger.info("mlem [ok]")
     
     # Update returned values.
@@ -258,13 +296,24 @@ def mlem(xtomo, iters=1, num_grid=None, init_matrix=None, overwrite=True):
     
 def gridrec(xtomo, overwrite=True, *args, **kwargs):
 
+    # Run deferred steps first.
+    xtomo.compute()
+
     # Check input.
     if not isinstance(xtomo.center, np.float32):
         xtomo.center = np.array(xtomo.center, dtype='float32')
     
+    # Gridrec takes the minus log unless told otherwise.
+    if xtomo.minus_log:
+        kwargs.setdefault('fluorescence', 1)
+        
     # Initialize and perform reconstruction.    
-    recon = Gridrec(xtomo.data, *args, **kwargs)
-    data_recon = recon.reconstruct(xtomo.data, xtomo.center, xtomo.theta)
+    out = kwargs.pop('out', None)
+    recon = kwargs.pop('session', None)
+    if recon is None:
+        recon = Gridrec(xtomo.data, *args, **kwargs)
+    data_recon = recon.reconstruct(xtomo.data, xtomo.center, xtomo.theta,
+                                   out=out)
     
     # Update provenance and log.
     xtomo.logger.info("gridrec [ok]")
@@ -275,6 +324,22 @@ def gridrec(xtomo, overwrite=True, *args, **kwargs):
 
 # --------------------------------------------------------------------
 
+def gridrec_session(xtomo, *args, **kwargs):
+    """
+    Open a ``Gridrec`` object for the geometry of the data.
+    
+    Pass it to ``gridrec`` as ``session`` to reuse its
+    lookup tables and FFT plans for many slabs with the
+    same angles and no more slices, and ``close`` it when
+    done. Arguments are those of ``Gridrec``.
+    """
+    # Gridrec takes the minus log unless told otherwise.
+    if xtomo.minus_log:
+        kwargs.setdefault('fluorescence', 1)
+    return Gridrec(xtomo.data, *args, **kwargs).open(xtomo.theta)
+
+# --------------------------------------------------------------------
+
 # Hook all these methods to TomoPy.
 setattr(XTomoDataset, 'diagnose_center', diagnose_center)
 setattr(XTomoDataset, 'optimize_center', optimize_center)
@@ -282,6 +347,7 @@ setattr(XTomoDataset, 'upsample2d', upsample2d)
 setattr(XTomoDataset, 'upsample3d', upsample3d)
 setattr(XTomoDataset, 'art', art)
 setattr(XTomoDataset, 'gridrec', gridrec)
+setattr(XTomoDataset, 'gridrec_session', gridrec_session)
 setattr(XTomoDataset, 'mlem', mlem)
 
 # Use original function docstrings for the wrappers.
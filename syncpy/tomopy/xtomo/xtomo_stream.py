@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+This module containes out-of-core drivers that run
+X-ray absorption tomography pipelines on Data Exchange
+HDF5 files slab by slab.
+"""
+
+import h5py
+import os
+import logging
+import threading
+import traceback
+from Queue import Empty, Full, Queue
+
+# Import main TomoPy object.
+from syncpy.tomopy.xtomo.xtomo_dataset import XTomoDataset
+
+# Import multiprocessing module.
+from syncpy.tomopy.tools.multiprocess import WorkerPool
+
+# Methods that need more than a slab of slices.
+_NOT_STREAMABLE = ('phase_retrieval', 'downsample3d',
+                   'diagnose_center', 'optimize_center',
+                   'gridrec_session')
+
+# Methods that produce data_recon.
+_RECON_METHODS = ('gridrec', 'art', 'mlem')
+
+logger = logging.getLogger("tomopy")
+
+# --------------------------------------------------------------------
+
+def _parse_steps(steps):
+    """
+    Turn a list of method names or (name, kwargs) pairs
+    into a list of (name, kwargs) pairs ending with a
+    reconstruction method.
+    """
+    parsed = []
+    for step in steps:
+        if isinstance(step, basestring):
+            name, kwargs = step, {}
+        else:
+            name, kwargs = step
+        if name in _NOT_STREAMABLE:
+            raise ValueError(name + " needs whole projections " +
+                             "and can not be streamed by slices")
+        if not hasattr(XTomoDataset, name):
+            raise ValueError("unknown method: " + name)
+        parsed.append((name, dict(kwargs)))
+    if not len(parsed) or parsed[-1][0] not in _RECON_METHODS:
+        parsed.append(('gridrec', {}))
+    return parsed
+
+# --------------------------------------------------------------------
+
+def slab_size(num_projections, num_white, num_dark, num_pixels,
+              mem_budget):
+    """
+    Number of slices per slab that keeps one slab within
+    ``mem_budget`` bytes.
+
+    The estimate counts the float32 projections, white and
+    dark fields twice (input plus one working copy) and the
+    reconstructed slices once.
+    """
+    bytes_per_slice = 4 * (2 * (num_projections + num_white + num_dark) *
+                           num_pixels + num_pixels ** 2)
+    num_slices = int(mem_budget // bytes_per_slice)
+    if num_slices > 1:
+        num_slices -= num_slices % 2 # gridrec works on slice pairs
+    return max(1, num_slices)
+
+# --------------------------------------------------------------------
+
+def _put(queue, item, stop):
+    """
+    Put ``item`` on a bounded queue, waiting for room
+    unless the pipeline is stopped.
+    """
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            pass
+    return False
+
+def _get(queue, stop):
+    """
+    Get the next item of a queue, or ``None`` once the
+    pipeline is stopped.
+    """
+    while not stop.is_set():
+        try:
+            return queue.get(timeout=0.1)
+        except Empty:
+            pass
+    return None
+
+# --------------------------------------------------------------------
+
+def _read_slabs(fin, bounds, read_queue, stop, errors):
+    """
+    Read slabs of projections, white and dark fields
+    into ``read_queue``, ending with ``None``.
+    """
+    data = fin['/exchange/data']
+    data_white = fin.get('/exchange/data_white')
+    data_dark = fin.get('/exchange/data_dark')
+    try:
+        for ind_start, ind_end in bounds:
+            slab_white, slab_dark = None, None
+            if data_white is not None:
+                slab_white = data_white[:, ind_start:ind_end, :]
+            if data_dark is not None:
+                slab_dark = data_dark[:, ind_start:ind_end, :]
+            slab = data[:, ind_start:ind_end, :]
+            if not _put(read_queue, (ind_start, ind_end, slab,
+                                     slab_white, slab_dark), stop):
+                return
+        _put(read_queue, None, stop)
+    except Exception:
+        errors.append(traceback.format_exc())
+        stop.set()
+
+def _write_slabs(fout, dataset_name, num_slices, slices_start,
+                 write_queue, stop, errors):
+    """
+    Write reconstructed slabs from ``write_queue`` until
+    ``None`` arrives.
+    """
+    recon = None
+    try:
+        while True:
+            item = _get(write_queue, stop)
+            if item is None:
+                break
+            ind_start, ind_end, data_recon = item
+            
+            # The output volume is created once the
+            # reconstructed image size is known.
+            if recon is None:
+                num_x, num_y = data_recon.shape[1:]
+                recon = fout.create_dataset(dataset_name,
+                                            (num_slices, num_x, num_y),
+                                            dtype='float32',
+                                            chunks=(1, num_x, num_y))
+            recon[ind_start-slices_start:ind_end-slices_start] = data_recon
+            logger.info("stream_recon: slices " + str(ind_start) +
+                        "-" + str(ind_end) + " [ok]")
+    except Exception:
+        errors.append(traceback.format_exc())
+        stop.set()
+
+# --------------------------------------------------------------------
+
+def stream_recon(file_name, output_file, steps, center,
+                 mem_budget=2 * 1024 ** 3, slices_per_slab=None,
+                 slices_start=0, slices_end=None,
+                 dataset_name='/exchange/data',
+                 num_cores=None, log='INFO', prefetch=1, **kwargs):
+    """
+    Reconstruct a Data Exchange file slab by slab.
+
+    Reads slabs of slices from ``/exchange/data`` (and the
+    matching white and dark fields), runs the chained
+    methods on each slab and writes the reconstructed
+    slices to ``output_file``, so the whole data never has
+    to fit in memory. Reading and writing run in their own
+    threads: the next slabs are read and the previous ones
+    written while the current slab is processed.
+
+    Parameters
+    ----------
+    file_name : str
+        Input Data Exchange HDF5 file.
+
+    output_file : str
+        Output HDF5 file for the reconstructed slices.
+
+    steps : list
+        Methods of ``XTomoDataset`` to run on each slab, given
+        by name or as ``(name, kwargs)`` pairs, for example
+        ``['normalize', ('stripe_removal', {'level': 8})]``.
+        ``gridrec`` is appended if the list does not end with
+        a reconstruction method. Methods that need whole
+        projections (e.g. ``phase_retrieval``) are rejected.
+
+    center : scalar
+        Rotation center.
+
+    mem_budget : scalar, optional
+        Approximate peak memory in bytes used by all the
+        slabs in the pipeline.
+
+    slices_per_slab : scalar, optional
+        Number of slices per slab. Overrides ``mem_budget``.
+
+    slices_start, slices_end : scalar, optional
+        Range of slices to reconstruct.
+
+    dataset_name : str, optional
+        Name of the output dataset.
+
+    num_cores : scalar, optional
+        Size of the worker pool shared by all slabs.
+
+    log : str, optional
+        Logging level of the per-slab datasets.
+        
+    prefetch : scalar, optional
+        Number of slabs waiting to be processed, and to be
+        written. Up to ``2 * prefetch + 3`` slabs are held at
+        a time.
+
+    kwargs : optional
+        Extra arguments passed to ``XTomoDataset``.
+    """
+    steps = _parse_steps(steps)
+    file_name = os.path.abspath(file_name)
+    if prefetch < 1:
+        raise ValueError("prefetch must be at least 1")
+
+    fin = h5py.File(file_name, 'r')
+    data = fin['/exchange/data']
+    data_white = fin.get('/exchange/data_white')
+    data_dark = fin.get('/exchange/data_dark')
+    theta = fin.get('/exchange/theta')
+    if theta is not None:
+        theta = theta[:]
+
+    num_projections, num_slices, num_pixels = data.shape
+    if slices_end is None or slices_end > num_slices:
+        slices_end = num_slices
+    if slices_per_slab is None:
+        num_white = 0 if data_white is None else data_white.shape[0]
+        num_dark = 0 if data_dark is None else data_dark.shape[0]
+        slices_per_slab = slab_size(num_projections, num_white, num_dark,
+                                    num_pixels,
+                                    mem_budget // (2 * prefetch + 3))
+    bounds = [(ind_start, min(ind_start + slices_per_slab, slices_end))
+              for ind_start in range(slices_start, slices_end, slices_per_slab)]
+
+    fout = h5py.File(output_file, 'w')
+    session = None
+
+    # Slabs go from the reader thread through this thread to
+    # the writer thread. Bounded queues keep the memory fixed.
+    read_queue = Queue(maxsize=prefetch)
+    write_queue = Queue(maxsize=prefetch)
+    stop = threading.Event()
+    errors = []
+    reader = threading.Thread(target=_read_slabs,
+                              args=(fin, bounds, read_queue, stop, errors))
+    writer = threading.Thread(target=_write_slabs,
+                              args=(fout, dataset_name,
+                                    slices_end - slices_start, slices_start,
+                                    write_queue, stop, errors))
+
+    pool = WorkerPool(num_cores)
+    pool.start()
+    reader.start()
+    writer.start()
+    try:
+        while True:
+            item = _get(read_queue, stop)
+            if item is None:
+                break
+            ind_start, ind_end, slab, slab_white, slab_dark = item
+            xtomo = XTomoDataset(slab, slab_white, slab_dark, theta,
+                                 log=log, **kwargs)
+            xtomo.pool = pool
+            xtomo.center = center
+
+            # Process it. All slabs share one gridrec session.
+            for name, step_kwargs in steps:
+                if name == 'gridrec':
+                    if session is None:
+                        session = xtomo.gridrec_session(**step_kwargs)
+                    step_kwargs = dict(step_kwargs, session=session)
+                getattr(xtomo, name)(**step_kwargs)
+
+            # Hand it over for writing.
+            if not _put(write_queue, (ind_start, ind_end,
+                                      xtomo.data_recon), stop):
+                break
+        _put(write_queue, None, stop)
+    except:
+        stop.set()
+        raise
+    finally:
+        reader.join()
+        writer.join()
+        if session is not None:
+            session.close()
+        pool.shutdown()
+        fin.close()
+        fout.close()
+    if errors:
+        raise RuntimeError("stream_recon failed:\n" + errors[0])
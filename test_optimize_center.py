@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+
+try:
+    import syncpy
+except OSError: # the C libraries are not built.
+    syncpy = None
+
+
+def phantom_projections(num_projs, num_pixels, center):
+    """
+    Transmission of a few discs rotated about ``center``.
+    """
+    theta = np.linspace(0, 180, num_projs, endpoint=False)
+    discs = [(0., 0., 40., 0.01), (20., -10., 8., 0.03),
+             (-25., 15., 5., 0.05)]
+    u = np.arange(num_pixels, dtype='float64')
+    t = np.radians(theta)[:, np.newaxis]
+    sino = np.zeros((num_projs, num_pixels))
+    for x0, y0, r, mu in discs:
+        s = center + x0 * np.cos(t) + y0 * np.sin(t)
+        sino += 2 * mu * np.sqrt(np.clip(r**2 - (u - s)**2, 0, None))
+    data = 1000 * np.exp(-sino[:, np.newaxis, :])
+    data = np.repeat(data, 4, axis=1)
+    return data, theta
+
+
+@unittest.skipIf(syncpy is None, "syncpy C libraries are not available")
+class OptimizeCenterTest(unittest.TestCase):
+
+    def dataset(self, center):
+        data, theta = phantom_projections(180, 128, center)
+        return syncpy.tomopy.xtomodataset(data, 1000 * np.ones((1, 4, 128)),
+                                          np.zeros((1, 4, 128)), theta,
+                                          color_log=False)
+
+    def test_center_after_minus_log(self):
+        d = self.dataset(67.5)
+        d.normalize(minus_log=True)
+        d.optimize_center(center_init=64, tol=0.25)
+        self.assertAlmostEqual(d.center, 67.5, delta=0.5)
+
+    def test_center_without_guess(self):
+        # The coarse best is more than one binned pixel off.
+        d = self.dataset(59.25)
+        d.normalize()
+        d.optimize_center(tol=0.25)
+        self.assertAlmostEqual(d.center, 59.25, delta=0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()